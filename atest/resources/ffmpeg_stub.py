@@ -0,0 +1,27 @@
+#!/usr/bin/env python
+
+"""Stands in for ffmpeg in the acceptance tests when it is not installed.
+
+Reads the raw frames from the standard input and writes the number of bytes
+it got to the output file, which is the last argument. With ``-encoders`` it
+lists the codecs of the encoders of the library like ffmpeg lists them.
+"""
+import os
+import sys
+
+if sys.platform == 'win32' and not hasattr(sys.stdin, 'buffer'):
+    # Python 2 reads the standard input in text mode on Windows.
+    import msvcrt
+    msvcrt.setmode(sys.stdin.fileno(), os.O_BINARY)
+if '-encoders' in sys.argv:
+    print(' V....D libx264              stub\n V....D libvpx               stub')
+    sys.exit(0)
+stdin = getattr(sys.stdin, 'buffer', sys.stdin)
+size = 0
+while True:
+    data = stdin.read(65536)
+    if not data:
+        break
+    size += len(data)
+with open(sys.argv[-1], 'w') as output:
+    output.write('%d\n' % size)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+"""usage: python benchmarks/frame_allocations.py [width height size_percentage]
+
+Measures the memory allocated per recorded frame by the capture -> change
+detection -> resize -> color conversion path, without a display. A synthetic
+mss-like screenshot is used as the frame source. The old path, which allocated
+new arrays for every frame, is measured next to the current one based on
+reusable buffers. Change detection compares each frame with an identical
+previous one, which is the case where all pixels have to be compared.
+
+Examples:
+    python benchmarks/frame_allocations.py
+    python benchmarks/frame_allocations.py 3840 2160 0.5
+"""
+import itertools
+import sys
+import tracemalloc
+
+from os.path import abspath, dirname, join
+
+import cv2
+import numpy as np
+
+CURDIR = dirname(abspath(__file__))
+sys.path.append(join(CURDIR, '..', 'src'))
+
+from ScreenCapLibrary.frames import ChangeDetector, FrameConverter, FramePool, mss_to_numpy
+
+WARMUP = 5
+FRAMES = 50
+
+
+class SyntheticScreenShot(object):
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.raw = bytearray(np.random.randint(0, 255, width * height * 4, dtype=np.uint8).tobytes())
+
+    @property
+    def __array_interface__(self):
+        return {'version': 3, 'shape': (self.height, self.width, 4), 'typestr': '|u1', 'data': self.raw}
+
+
+def old_path(sct_img, previous, width, height, size_percentage):
+    numpy_array = np.array(sct_img)
+    np.array_equal(numpy_array.view(np.uint32), np.array(previous).view(np.uint32))
+    if size_percentage != 1:
+        numpy_array = cv2.resize(numpy_array, (int(width * size_percentage), int(height * size_percentage)),
+                                 interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(numpy_array, cv2.COLOR_RGBA2RGB)
+
+
+def measure(frame_function):
+    for _ in range(WARMUP):
+        frame_function()
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before, _ = tracemalloc.get_traced_memory()
+    allocated = 0
+    for _ in range(FRAMES):
+        frame_function()
+        current, peak = tracemalloc.get_traced_memory()
+        allocated += peak - before
+        tracemalloc.reset_peak()
+    tracemalloc.stop()
+    return allocated / FRAMES
+
+
+def main(width=1920, height=1080, size_percentage=0.5):
+    sct_img = SyntheticScreenShot(width, height)
+    previous = SyntheticScreenShot(width, height)
+    previous.raw[:] = sct_img.raw
+    detector = ChangeDetector()
+    converter = FrameConverter(width, height, size_percentage, cv2.COLOR_RGBA2RGB)
+    pool = FramePool(converter.shape, 2)
+
+    screenshots = itertools.cycle((sct_img, previous))
+
+    def new_path():
+        pixels = mss_to_numpy(next(screenshots))
+        detector.changed(pixels)
+        frame = converter.convert(pixels, pool.acquire())
+        pool.release(frame)
+
+    old = measure(lambda: old_path(sct_img, previous, width, height, size_percentage))
+    new = measure(new_path)
+    print('%dx%d at size_percentage %s, bytes allocated per frame:' % (width, height, size_percentage))
+    print('  new arrays per frame: %12d' % old)
+    print('  reusable buffers:     %12d' % new)
+    return 0 if new < 64 * 1024 else 1
+
+
+if __name__ == '__main__':
+    if '--help' in sys.argv:
+        print(__doc__)
+        sys.exit(251)
+    args = sys.argv[1:]
+    sys.exit(main(int(args[0]), int(args[1]), float(args[2])) if args else main())
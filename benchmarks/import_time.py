@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+
+"""usage: python benchmarks/import_time.py [options]
+
+Measures how long importing ScreenCapLibrary and creating the library
+instance take, like Robot Framework does when a suite, a dry-run or libdoc
+uses the library. Every round runs in a fresh interpreter that has imported
+Robot Framework already, so only the cost of the library itself is measured.
+
+Modules that are slow to import, like OpenCV, NumPy or Pillow, must only be
+imported once a keyword needs them. Any such module loaded by the import is
+reported, as is a median import time above ``--limit``. The exit code is the
+number of problems found.
+
+Options:
+    --rounds ROUNDS  Number of fresh interpreters to measure (default 5).
+    --limit MS       Highest allowed median import time in milliseconds (default 100).
+
+Examples:
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --rounds 20 --limit 50
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+from os.path import abspath, dirname, join
+
+CURDIR = dirname(abspath(__file__))
+SRC = join(CURDIR, '..', 'src')
+
+HEAVY_MODULES = ['cv2', 'numpy', 'PIL.Image', 'imageio', 'mss', 'pyautogui', 'gi', 'gtk', 'ctypes.util']
+
+MEASURE = '''
+import json, sys, timeit
+sys.path.insert(0, %r)
+import robot.api, robot.libraries.BuiltIn
+start = timeit.default_timer()
+import ScreenCapLibrary
+ScreenCapLibrary.ScreenCapLibrary()
+elapsed = timeit.default_timer() - start
+print(json.dumps({'seconds': elapsed, 'modules': [name for name in %r if name in sys.modules]}))
+''' % (SRC, HEAVY_MODULES)
+
+
+def measure():
+    output = subprocess.check_output([sys.executable, '-c', MEASURE])
+    return json.loads(output.decode('utf-8').splitlines()[-1])
+
+
+def main(args):
+    rounds = [measure() for _ in range(args.rounds)]
+    times = sorted(result['seconds'] * 1000 for result in rounds)
+    median = times[len(times) // 2]
+    print('Import and library creation: %.1f ms median, %.1f ms min, %.1f ms max over %d rounds.'
+          % (median, times[0], times[-1], len(times)))
+    problems = []
+    for module in sorted(set(name for result in rounds for name in result['modules'])):
+        problems.append("Importing the library imported '%s'." % module)
+    if median > args.limit:
+        problems.append('The median import time %.1f ms is above the limit of %.1f ms.' % (median, args.limit))
+    for problem in problems:
+        print('PROBLEM %s' % problem)
+    return min(len(problems), 250)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--limit', type=float, default=100)
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    if '--help' in sys.argv:
+        print(__doc__)
+        sys.exit(251)
+    sys.exit(main(parse_args(sys.argv[1:])))
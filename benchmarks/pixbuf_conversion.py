@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+"""usage: python benchmarks/pixbuf_conversion.py [rounds]
+
+Measures how long turning a GTK pixbuf into a NumPy array and converting it
+into a recorded frame takes, without a display. Synthetic pixbufs are used,
+both with unpadded rows and with rows padded at the end, as GTK does when the
+row length is not aligned. The old conversion, which copied padded pixbufs
+row by row in Python, is measured next to the current one.
+
+Examples:
+    python benchmarks/pixbuf_conversion.py
+    python benchmarks/pixbuf_conversion.py 50
+"""
+import sys
+import timeit
+
+from os.path import abspath, dirname, join
+
+import cv2
+import numpy as np
+
+CURDIR = dirname(abspath(__file__))
+sys.path.append(join(CURDIR, '..', 'src'))
+
+from ScreenCapLibrary.frames import FrameConverter
+from ScreenCapLibrary.pygtk import _convert_pixbuf_to_numpy
+
+RESOLUTIONS = [(1280, 720), (1920, 1080), (2560, 1440), (3840, 2160)]
+CHANNELS = 3
+PADDING = 64
+
+
+class SyntheticPixbuf(object):
+
+    def __init__(self, width, height, rowstride):
+        self.width = width
+        self.height = height
+        self.rowstride = rowstride
+        # Like in GTK, the last row is not padded.
+        size = rowstride * (height - 1) + width * CHANNELS
+        self.pixels = np.random.randint(0, 255, size, dtype=np.uint8).tobytes()
+
+    def get_width(self):
+        return self.width
+
+    def get_height(self):
+        return self.height
+
+    def get_n_channels(self):
+        return CHANNELS
+
+    def get_rowstride(self):
+        return self.rowstride
+
+    def get_pixels(self):
+        return self.pixels
+
+
+def old_conversion(pixbuf):
+    w, h, c, r = (pixbuf.get_width(), pixbuf.get_height(), pixbuf.get_n_channels(), pixbuf.get_rowstride())
+    a = np.frombuffer(pixbuf.get_pixels(), dtype=np.uint8)
+    if a.shape[0] == w * c * h:
+        return a.reshape((h, w, c))
+    else:
+        b = np.zeros((h, w * c), 'uint8')
+        for j in range(h):
+            b[j, :] = a[r * j:r * j + w * c]
+        return b.reshape((h, w, c))
+
+
+def measure(function, rounds):
+    return min(timeit.repeat(function, number=1, repeat=rounds)) * 1000
+
+
+def main(rounds=20):
+    failed = False
+    print('%-11s %-9s %12s %12s' % ('resolution', 'rows', 'old (ms)', 'new (ms)'))
+    for width, height in RESOLUTIONS:
+        converter = FrameConverter(width, height, 1, cv2.COLOR_RGB2BGR)
+        for rows, rowstride in [('unpadded', width * CHANNELS), ('padded', width * CHANNELS + PADDING)]:
+            pixbuf = SyntheticPixbuf(width, height, rowstride)
+            if not np.array_equal(converter.convert(old_conversion(pixbuf)).copy(),
+                                  converter.convert(_convert_pixbuf_to_numpy(pixbuf))):
+                print('Conversion of %dx%d %s pixbuf differs!' % (width, height, rows))
+                failed = True
+            old = measure(lambda: converter.convert(old_conversion(pixbuf)), rounds)
+            new = measure(lambda: converter.convert(_convert_pixbuf_to_numpy(pixbuf)), rounds)
+            print('%-11s %-9s %12.2f %12.2f' % ('%dx%d' % (width, height), rows, old, new))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    if '--help' in sys.argv:
+        print(__doc__)
+        sys.exit(251)
+    args = sys.argv[1:]
+    sys.exit(main(int(args[0])) if args else main())
@@ -0,0 +1,297 @@
+#!/usr/bin/env python
+
+"""usage: python benchmarks/recording.py [options]
+
+Drives video recordings, GIF recordings and screenshots through the library
+from the grab to the written file, across resolutions, size percentages,
+encoders, formats and quality levels. By default the screen is synthetic, so
+no display is needed, but ``--source screen`` grabs the real display, for
+example one started with ``xvfb-run``.
+
+Every scenario reports its frame rate, latencies, written bytes and the
+resident memory of the process afterwards. ``--output`` saves the results as
+JSON, which a later run can be compared with using ``--baseline``. Metrics
+that got worse by more than ``--tolerance`` are listed as regressions and
+the exit code is their number.
+
+Options:
+    --quick             Run only a few small scenarios.
+    --source SOURCE     ``synthetic`` (default) or ``screen``.
+    --module MODULE     Screenshot module grabbing the real screen, e.g. ``xshm`` (default mss).
+    --duration SECONDS  How long each recording runs (default 3).
+    --fps FPS           Frame rate the videos are recorded at (default 30).
+    --output PATH       Write the results as JSON to PATH.
+    --baseline PATH     Compare the results with an earlier ``--output``.
+    --tolerance RATIO   Allowed relative change before a regression (default 0.2).
+
+Examples:
+    python benchmarks/recording.py --quick
+    python benchmarks/recording.py --output baseline.json
+    python benchmarks/recording.py --baseline baseline.json
+    xvfb-run -s '-screen 0 1920x1080x24' python benchmarks/recording.py --source screen
+    xvfb-run -s '-screen 0 1920x1080x24' python benchmarks/recording.py --source screen --module xshm
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+from os.path import abspath, dirname, join
+
+import cv2
+import numpy as np
+from mss import mss
+from mss.screenshot import ScreenShot
+from mss.tools import to_png
+
+CURDIR = dirname(abspath(__file__))
+sys.path.append(join(CURDIR, '..', 'src'))
+
+from ScreenCapLibrary.backends import BACKENDS
+from ScreenCapLibrary.capture import capture_session
+from ScreenCapLibrary.client import Client
+from ScreenCapLibrary.gifclient import GifClient
+from ScreenCapLibrary.utils import monotonic
+from ScreenCapLibrary.videoclient import VideoClient
+
+RESOLUTIONS = [(1280, 720), (1920, 1080), (3840, 2160)]
+SIZE_PERCENTAGES = [1, 0.5]
+ENCODERS = ['vp8', 'mp4v', 'mjpg']
+GIF_SIZE_PERCENTAGES = [0.5, 0.25]
+SCREENSHOTS = [('png', 0), ('png', 50), ('jpg', 50), ('jpg', 90), ('webp', 50), ('webp', 90)]
+SCREENSHOT_ROUNDS = 10
+
+QUICK_RESOLUTIONS = [(1280, 720)]
+QUICK_ENCODERS = ['mjpg']
+QUICK_SCREENSHOTS = [('png', 50), ('jpg', 50)]
+
+# Throughput must not get lower, everything else must not get higher.
+HIGHER_IS_BETTER = ('fps',)
+# Latencies changing less than this are noise, however large the relative change.
+LATENCY_NOISE = 0.001
+
+
+class SyntheticScreen(object):
+    """Stands in for ``mss`` with a desktop-like screen of ``width`` x ``height``.
+
+    A few frames with a moving element are generated once and returned in
+    turn, so that grabbing costs about as much as copying a real screen.
+    """
+
+    frame_count = 8
+
+    def __init__(self, width, height):
+        self.monitors = [{'left': 0, 'top': 0, 'width': width, 'height': height}] * 2
+        self.compression_level = 6
+        self._frames = {}
+        self._index = 0
+
+    def shot(self, mon=1, output='monitor-{mon}.png'):
+        sct_img = self.grab(self.monitors[max(mon, 0)])
+        to_png(sct_img.rgb, sct_img.size, level=self.compression_level, output=output)
+        return output
+
+    def grab(self, region):
+        size = (region['width'], region['height'])
+        if size not in self._frames:
+            self._frames[size] = self._generate(*size)
+        self._index = (self._index + 1) % self.frame_count
+        return ScreenShot(bytearray(self._frames[size][self._index]), region)
+
+    def _generate(self, width, height):
+        background = np.full((height, width, 4), 230, dtype=np.uint8)
+        cv2.rectangle(background, (0, 0), (width, height // 20), (90, 60, 40, 255), -1)
+        for row in range(height // 10, height, max(height // 10, 1)):
+            cv2.putText(background, 'Robot Framework ScreenCapLibrary %d' % row, (width // 20, row),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1, (30, 30, 30, 255), 2)
+        frames = []
+        for index in range(self.frame_count):
+            frame = background.copy()
+            x = index * (width // self.frame_count)
+            cv2.rectangle(frame, (x, height // 2), (x + width // 10, height // 2 + height // 10),
+                          (40, 140, 40, 255), -1)
+            frames.append(frame.tobytes())
+        return frames
+
+    def close(self):
+        pass
+
+
+def use_screen(source, width=None, height=None):
+    capture_session.close_all()
+    capture_session.factory = (lambda: SyntheticScreen(width, height)) if source == 'synthetic' else mss
+    return capture_session.size(1)
+
+
+def rss_bytes():
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError, AttributeError):
+        return None
+
+
+def recording_metrics(statistics):
+    return {
+        'fps': statistics['achieved_fps'],
+        'grab_latency_p50': statistics['grab_latency_p50'],
+        'grab_latency_p95': statistics['grab_latency_p95'],
+        'encode_latency_p50': statistics['encode_latency_p50'],
+        'encode_latency_p95': statistics['encode_latency_p95'],
+        'dropped_frames': statistics['dropped_frames'],
+        'bytes': statistics['bytes_written'],
+    }
+
+
+def video(module, directory, size_percentage, encoder, fps, duration):
+    client = VideoClient(module, directory, fps, False, 0, encoder)
+    client.start_video_recording(None, 'video', size_percentage, False, '800px', 1)
+    time.sleep(duration)
+    client.stop_video_recording(True)
+    return recording_metrics(client.statistics.as_dict())
+
+
+def gif(module, directory, size_percentage, duration):
+    client = GifClient(module, directory)
+    client.start_gif_recording('gif', size_percentage, False, '800px', 1, False)
+    time.sleep(duration)
+    client.stop_gif_recording(True)
+    return recording_metrics(client.statistics.as_dict())
+
+
+def screenshot(module, directory, format, quality):
+    client = Client(module, directory, format, quality)
+    latencies = []
+    sizes = []
+    for _ in range(SCREENSHOT_ROUNDS):
+        start = monotonic()
+        # Take Screenshot does the same and then logs the path, which needs a running Robot.
+        path = client._take_screenshot_client('screenshot', format, quality, 1)
+        latencies.append(monotonic() - start)
+        sizes.append(os.path.getsize(path))
+        os.remove(path)
+    latencies.sort()
+    return {
+        'fps': len(latencies) / sum(latencies),
+        'latency_p50': latencies[len(latencies) // 2],
+        'latency_p95': latencies[int(len(latencies) * 0.95)],
+        'bytes': sum(sizes) // len(sizes),
+    }
+
+
+def scenarios(module, resolutions, quick, fps, duration):
+    for width, height in resolutions:
+        resolution = '%dx%d' % (width, height)
+        for encoder in QUICK_ENCODERS if quick else ENCODERS:
+            for size_percentage in SIZE_PERCENTAGES:
+                yield ((width, height), 'video-%s-%s-%s' % (resolution, size_percentage, encoder),
+                       lambda directory, size_percentage=size_percentage, encoder=encoder:
+                       video(module, directory, size_percentage, encoder, fps, duration))
+        for size_percentage in GIF_SIZE_PERCENTAGES[:1] if quick else GIF_SIZE_PERCENTAGES:
+            yield ((width, height), 'gif-%s-%s' % (resolution, size_percentage),
+                   lambda directory, size_percentage=size_percentage:
+                   gif(module, directory, size_percentage, duration))
+        for format, quality in QUICK_SCREENSHOTS if quick else SCREENSHOTS:
+            yield ((width, height), 'screenshot-%s-%s-%s' % (resolution, format, quality),
+                   lambda directory, format=format, quality=quality:
+                   screenshot(module, directory, format, quality))
+
+
+def run(source, module, quick, fps, duration):
+    # The real screen has only its own resolution.
+    resolutions = [use_screen(source)] if source == 'screen' else QUICK_RESOLUTIONS if quick else RESOLUTIONS
+    results = []
+    directory = tempfile.mkdtemp()
+    try:
+        for (width, height), name, scenario in scenarios(module, resolutions, quick, fps, duration):
+            use_screen(source, width, height)
+            metrics = scenario(directory)
+            metrics['rss_bytes'] = rss_bytes()
+            results.append({'name': name, 'metrics': metrics})
+            print(format_result(name, metrics))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+def format_result(name, metrics):
+    latency = metrics.get('grab_latency_p95', metrics.get('latency_p95'))
+    return '%-32s %8.1f fps %8.1f ms p95 %12d bytes' % (name, metrics['fps'] or 0, (latency or 0) * 1000,
+                                                        metrics['bytes'])
+
+
+def compare(results, baseline, tolerance):
+    previous = dict((result['name'], result['metrics']) for result in baseline['results'])
+    regressions = []
+    for result in results:
+        for metric, value in sorted(result['metrics'].items()):
+            old = previous.get(result['name'], {}).get(metric)
+            if old is None or value is None:
+                continue
+            if 'latency' in metric and abs(value - old) < LATENCY_NOISE:
+                continue
+            if not old:
+                # E.g. frames are dropped where none were before.
+                change = float('inf') if value > 0 and metric not in HIGHER_IS_BETTER else 0
+            else:
+                change = (value - old) / float(old)
+                if metric in HIGHER_IS_BETTER:
+                    change = -change
+            if change > tolerance:
+                regressions.append('%s %s: %.4g -> %.4g' % (result['name'], metric, old, value))
+    return regressions
+
+
+def main(args):
+    if args.source == 'synthetic' and args.module != 'mss':
+        # The synthetic screen replaces what mss grabs.
+        print('--module %s requires --source screen.' % args.module)
+        return 252
+    results = run(args.source, args.module, args.quick, args.fps, args.duration)
+    report = {
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'opencv': cv2.__version__,
+            'source': args.source,
+            'module': args.module,
+            'fps': args.fps,
+            'duration': args.duration,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as baseline:
+        regressions = compare(results, json.load(baseline), args.tolerance)
+    for regression in regressions:
+        print('REGRESSION %s' % regression)
+    print('%d regressions compared to %s.' % (len(regressions), args.baseline))
+    return min(len(regressions), 250)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--quick', action='store_true')
+    parser.add_argument('--source', choices=['synthetic', 'screen'], default='synthetic')
+    parser.add_argument('--module', choices=sorted(BACKENDS), default='mss')
+    parser.add_argument('--duration', type=float, default=3)
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--output')
+    parser.add_argument('--baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    if '--help' in sys.argv:
+        print(__doc__)
+        sys.exit(251)
+    sys.exit(main(parse_args(sys.argv[1:])))
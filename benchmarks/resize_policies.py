@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+"""usage: python benchmarks/resize_policies.py [rounds]
+
+Measures how long scaling a grabbed frame down to ``size_percentage`` and
+converting it into a recorded frame takes with each ``resize`` policy of
+the recording keywords. No display is needed, the frames are synthetic
+screens with text on them. Next to the time per frame, the quality is
+reported as the PSNR compared with ``area``, "exact" meaning that the
+frames differ by rounding only. The policy ``auto`` would pick is marked.
+
+Examples:
+    python benchmarks/resize_policies.py
+    python benchmarks/resize_policies.py 50
+"""
+import sys
+import timeit
+
+from os.path import abspath, dirname, join
+
+import cv2
+import numpy as np
+
+CURDIR = dirname(abspath(__file__))
+sys.path.append(join(CURDIR, '..', 'src'))
+
+from ScreenCapLibrary.frames import AUTO, RESIZE_POLICIES, FrameConverter, resize_steps
+
+RESOLUTIONS = [(1280, 720), (1920, 1080), (3840, 2160)]
+SIZE_PERCENTAGES = [0.5, 0.25, 0.75, 0.3]
+# Above this the frames differ only by rounding.
+EXACT_PSNR = 50
+
+
+def synthetic_screen(width, height):
+    screen = np.full((height, width, 4), 230, dtype=np.uint8)
+    cv2.rectangle(screen, (0, 0), (width, height // 20), (90, 60, 40, 255), -1)
+    for row in range(height // 10, height, 24):
+        cv2.putText(screen, 'Robot Framework ScreenCapLibrary %d' % row, (width // 20, row),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (30, 30, 30, 255), 1)
+    return screen
+
+
+def measure(function, rounds):
+    function()
+    return min(timeit.repeat(function, number=1, repeat=rounds)) * 1000
+
+
+def main(rounds=20):
+    policies = [policy for policy in RESIZE_POLICIES if policy != AUTO]
+    print('%-11s %5s  %s' % ('resolution', 'size', '  '.join('%-19s' % policy for policy in policies)))
+    for width, height in RESOLUTIONS:
+        screen = synthetic_screen(width, height)
+        for size_percentage in SIZE_PERCENTAGES:
+            reference = None
+            results = []
+            for policy in policies:
+                converter = FrameConverter(width, height, size_percentage, cv2.COLOR_RGBA2RGB, policy)
+                frame = converter.convert(screen).copy()
+                if reference is None:
+                    reference = frame
+                psnr = cv2.PSNR(reference, frame)
+                quality = 'exact' if psnr > EXACT_PSNR else '%.1f dB' % psnr
+                chosen = resize_steps((width, height), converter.size, AUTO) == \
+                    resize_steps((width, height), converter.size, policy)
+                results.append('%7.2f ms %-8s%s' % (measure(lambda: converter.convert(screen), rounds), quality,
+                                                    '*' if chosen else ' '))
+            print('%-11s %5s  %s' % ('%dx%d' % (width, height), size_percentage, '  '.join(results)))
+    print('* The policy auto uses.')
+    return 0
+
+
+if __name__ == '__main__':
+    if '--help' in sys.argv:
+        print(__doc__)
+        sys.exit(251)
+    args = sys.argv[1:]
+    sys.exit(main(int(args[0])) if args else main())
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+
+"""usage: python benchmarks/video_encoders.py [width height frames]
+
+Measures the throughput and the file size of every video encoder available
+for `Start Video Recording`, without a display. The frames are synthetic: a
+static desktop-like background with a few changing elements, which is closer
+to a recorded test than random noise would be.
+
+Examples:
+    python benchmarks/video_encoders.py
+    python benchmarks/video_encoders.py 3840 2160 50
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from os.path import abspath, dirname, join
+
+import cv2
+import numpy as np
+
+CURDIR = dirname(abspath(__file__))
+sys.path.append(join(CURDIR, '..', 'src'))
+
+from ScreenCapLibrary.encoders import ALIASES, ENCODERS
+
+FPS = 24
+
+
+def synthetic_frames(width, height, count):
+    background = np.full((height, width, 3), 230, dtype=np.uint8)
+    cv2.rectangle(background, (0, 0), (width, height // 20), (90, 60, 40), -1)
+    for row in range(height // 10, height, height // 10):
+        cv2.putText(background, 'Robot Framework ScreenCapLibrary %d' % row, (width // 20, row),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1, (30, 30, 30), 2)
+    frames = []
+    for index in range(count):
+        frame = background.copy()
+        x = (index * 37) % (width - 200)
+        cv2.rectangle(frame, (x, height // 2), (x + 200, height // 2 + 100), (40, 140, 40), -1)
+        cv2.putText(frame, 'frame %d' % index, (width // 2, height - 50), cv2.FONT_HERSHEY_SIMPLEX, 2,
+                    (0, 0, 200), 3)
+        frames.append(frame)
+    return frames
+
+
+def measure(encoder, frames, directory):
+    height, width = frames[0].shape[:2]
+    path = join(directory, 'benchmark.%s' % encoder.extension)
+    try:
+        writer = encoder.open(path, FPS, (width, height))
+    except RuntimeError:
+        return None
+    start = time.time()
+    for frame in frames:
+        writer.write(frame)
+    writer.release()
+    elapsed = time.time() - start
+    size = os.path.getsize(path)
+    os.remove(path)
+    return len(frames) / elapsed, size
+
+
+def main(width=1920, height=1080, count=100):
+    frames = synthetic_frames(width, height, count)
+    directory = tempfile.mkdtemp()
+    aliases = dict((name, alias) for alias, name in ALIASES.items())
+    print('%d frames of %dx%d' % (count, width, height))
+    print('%-6s %-9s %-6s %10s %14s' % ('name', 'alias', 'file', 'fps', 'bytes/frame'))
+    try:
+        for name in sorted(ENCODERS):
+            encoder = ENCODERS[name]
+            result = measure(encoder, frames, directory)
+            if result is None:
+                print('%-6s %-9s %-6s %s' % (name, aliases.get(name, ''), encoder.extension, 'not available'))
+                continue
+            fps, size = result
+            print('%-6s %-9s %-6s %10.1f %14d' % (name, aliases.get(name, ''), encoder.extension, fps,
+                                                  size / count))
+    finally:
+        shutil.rmtree(directory)
+    return 0
+
+
+if __name__ == '__main__':
+    if '--help' in sys.argv:
+        print(__doc__)
+        sys.exit(251)
+    args = sys.argv[1:]
+    sys.exit(main(int(args[0]), int(args[1]), int(args[2])) if args else main())
@@ -0,0 +1,396 @@
+#  Copyright 2008-2015 Nokia Networks
+#  Copyright 2016-     Robot Framework Foundation
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import ctypes
+import os
+import threading
+
+from .capture import CaptureHub, capture_session, clip_region
+from .frames import mss_to_numpy
+from .pygtk import _grab_gtk_numpy, _take_gtk_monitor, _take_gtk_screenshot, _take_partial_gtk_screenshot
+from .utils import LazyModule, _compression_value_conversion, _pil_format_and_quality, cv2, np
+
+Image = LazyModule('PIL.Image')
+
+
+def to_image(pixels):
+    """Returns BGRA ``pixels`` as an RGB PIL image."""
+    height, width = pixels.shape[:2]
+    return Image.frombuffer('RGB', (width, height), np.ascontiguousarray(pixels), 'raw', 'BGRX', 0, 1)
+
+
+def _copy_to(pixels, out):
+    if out is None:
+        return pixels
+    np.copyto(out, pixels)
+    return out
+
+
+class CaptureBackend(object):
+    """Grabs the screen for screenshots and recordings.
+
+    Monitor 0 is the whole screen and the single monitors are numbered from 1,
+    like in ``mss``. Grabbed frames are BGRA arrays of shape ``(height, width,
+    4)``, written into ``out`` when the caller provides a buffer of that shape.
+    Otherwise a new array is returned, which the backend does not change
+    afterwards. Recordings grab through the `CaptureHub` in ``hub``, which
+    passes ``out`` to backends with ``reuse_buffers`` because they would
+    otherwise allocate or copy a new array for every grab.
+    """
+
+    name = None
+    reuse_buffers = False
+
+    def __init__(self):
+        self.hub = CaptureHub(self)
+
+    def monitor(self, index):
+        """Returns the ``left``, ``top``, ``width`` and ``height`` of the monitor."""
+        raise NotImplementedError
+
+    def size(self, monitor):
+        mon = self.monitor(monitor)
+        return mon['width'], mon['height']
+
+    def grab(self, monitor, out=None):
+        raise NotImplementedError
+
+    def grab_region(self, monitor, left, top, width, height, out=None):
+        """Grabs the rectangle given relative to the monitor, clipped to it."""
+        mon = self.monitor(monitor)
+        region = clip_region(mon, left, top, width, height)
+        left, top = region['left'] - mon['left'], region['top'] - mon['top']
+        return _copy_to(self.grab(monitor)[top:top + region['height'], left:left + region['width']], out)
+
+    def save(self, path, format, quality, monitor):
+        """Saves a screenshot of the monitor. ``quality`` is given like to `Take Screenshot`."""
+        self._save_image(self.grab(monitor), path, format, quality)
+
+    def save_region(self, path, format, quality, monitor, left, top, width, height):
+        self._save_image(self.grab_region(monitor, left, top, width, height), path, format, quality)
+
+    @staticmethod
+    def _save_image(pixels, path, format, quality):
+        format, quality = _pil_format_and_quality(format, quality)
+        to_image(pixels).save(path, format=format, quality=quality, compress_level=quality)
+
+    def close(self):
+        pass
+
+
+class MssBackend(CaptureBackend):
+    """Grabs with ``mss``, the default, on every platform it supports."""
+
+    name = 'mss'
+
+    def monitor(self, index):
+        return capture_session.monitor(index)
+
+    def grab(self, monitor, out=None):
+        return _copy_to(mss_to_numpy(capture_session.grab(monitor)), out)
+
+    def grab_region(self, monitor, left, top, width, height, out=None):
+        # Only the region is copied from the display instead of the whole monitor.
+        return _copy_to(mss_to_numpy(capture_session.grab_region(monitor, left, top, width, height)), out)
+
+    def close(self):
+        capture_session.close_all()
+
+
+class PyGtkBackend(CaptureBackend):
+    """Grabs with PyGTK or PyGObject, which also works on VNC displays.
+
+    Screenshots in PNG and JPEG format are saved by GTK directly. Recordings
+    get the pixbuf converted into the buffers of the `CaptureHub`.
+    """
+
+    name = 'pygtk'
+    reuse_buffers = True
+
+    def monitor(self, index):
+        return _take_gtk_monitor(int(index))
+
+    def grab(self, monitor, out=None):
+        pixels = _grab_gtk_numpy(int(monitor))
+        conversion = cv2.COLOR_RGBA2BGRA if pixels.shape[2] == 4 else cv2.COLOR_RGB2BGRA
+        return cv2.cvtColor(pixels, conversion, dst=out)
+
+    def save(self, path, format, quality, monitor):
+        if format == 'webp':
+            # GTK cannot write WEBP, so the pixels are encoded with PIL.
+            return CaptureBackend.save(self, path, format, quality, monitor)
+        format, quality = self._gtk_format_and_quality(format, quality)
+        _take_gtk_screenshot(path, format, quality, monitor)
+
+    def save_region(self, path, format, quality, monitor, left, top, width, height):
+        if format == 'webp':
+            return CaptureBackend.save_region(self, path, format, quality, monitor, left, top, width, height)
+        format, quality = self._gtk_format_and_quality(format, quality)
+        _take_partial_gtk_screenshot(path, format, quality, left, top, width, height, monitor)
+
+    @staticmethod
+    def _gtk_format_and_quality(format, quality):
+        format = 'jpeg' if format == 'jpg' else format
+        return format, _compression_value_conversion(quality) if format == 'png' else quality
+
+
+class _XShmSegmentInfo(ctypes.Structure):
+    _fields_ = [('shmseg', ctypes.c_ulong), ('shmid', ctypes.c_int), ('shmaddr', ctypes.c_void_p),
+                ('readOnly', ctypes.c_int)]
+
+
+class _XImage(ctypes.Structure):
+    # Only the leading fields that are read here.
+    _fields_ = [('width', ctypes.c_int), ('height', ctypes.c_int), ('xoffset', ctypes.c_int),
+                ('format', ctypes.c_int), ('data', ctypes.c_void_p), ('byte_order', ctypes.c_int),
+                ('bitmap_unit', ctypes.c_int), ('bitmap_bit_order', ctypes.c_int), ('bitmap_pad', ctypes.c_int),
+                ('depth', ctypes.c_int), ('bytes_per_line', ctypes.c_int), ('bits_per_pixel', ctypes.c_int)]
+
+
+_X_ERROR_HANDLER = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p, ctypes.c_void_p)
+_Z_PIXMAP = 2
+_ALL_PLANES = ctypes.c_ulong(-1).value
+_IPC_PRIVATE = 0
+_IPC_CREAT = 0o1000
+_IPC_RMID = 0
+# X error handlers are global to the process, so only one call at a time can trap errors.
+_x_error_lock = threading.Lock()
+
+
+class _XLib(object):
+    """The ``libX11``, ``libXext`` and ``libc`` functions used for MIT-SHM grabbing."""
+
+    def __init__(self):
+        # Imported here because finding libraries pulls in subprocess handling, which takes time.
+        import ctypes.util
+        x11, xext, libc = (ctypes.util.find_library(name) for name in ('X11', 'Xext', 'c'))
+        if not x11 or not xext:
+            raise RuntimeError('The xshm screenshot module needs the X11 client libraries.')
+        self.x11 = ctypes.CDLL(x11)
+        self.xext = ctypes.CDLL(xext)
+        self.libc = ctypes.CDLL(libc, use_errno=True)
+        self._declare(self.x11, 'XOpenDisplay', ctypes.c_void_p, [ctypes.c_char_p])
+        self._declare(self.x11, 'XCloseDisplay', ctypes.c_int, [ctypes.c_void_p])
+        self._declare(self.x11, 'XDefaultScreen', ctypes.c_int, [ctypes.c_void_p])
+        self._declare(self.x11, 'XRootWindow', ctypes.c_ulong, [ctypes.c_void_p, ctypes.c_int])
+        self._declare(self.x11, 'XDefaultVisual', ctypes.c_void_p, [ctypes.c_void_p, ctypes.c_int])
+        self._declare(self.x11, 'XDefaultDepth', ctypes.c_int, [ctypes.c_void_p, ctypes.c_int])
+        self._declare(self.x11, 'XSync', ctypes.c_int, [ctypes.c_void_p, ctypes.c_int])
+        self._declare(self.x11, 'XFree', ctypes.c_int, [ctypes.c_void_p])
+        self._declare(self.x11, 'XSetErrorHandler', ctypes.c_void_p, [ctypes.c_void_p])
+        self._declare(self.xext, 'XShmQueryExtension', ctypes.c_int, [ctypes.c_void_p])
+        self._declare(self.xext, 'XShmCreateImage', ctypes.POINTER(_XImage),
+                      [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int, ctypes.c_void_p,
+                       ctypes.POINTER(_XShmSegmentInfo), ctypes.c_uint, ctypes.c_uint])
+        self._declare(self.xext, 'XShmAttach', ctypes.c_int, [ctypes.c_void_p, ctypes.POINTER(_XShmSegmentInfo)])
+        self._declare(self.xext, 'XShmDetach', ctypes.c_int, [ctypes.c_void_p, ctypes.POINTER(_XShmSegmentInfo)])
+        self._declare(self.xext, 'XShmGetImage', ctypes.c_int,
+                      [ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(_XImage), ctypes.c_int, ctypes.c_int,
+                       ctypes.c_ulong])
+        self._declare(self.libc, 'shmget', ctypes.c_int, [ctypes.c_int, ctypes.c_size_t, ctypes.c_int])
+        self._declare(self.libc, 'shmat', ctypes.c_void_p, [ctypes.c_int, ctypes.c_void_p, ctypes.c_int])
+        self._declare(self.libc, 'shmdt', ctypes.c_int, [ctypes.c_void_p])
+        self._declare(self.libc, 'shmctl', ctypes.c_int, [ctypes.c_int, ctypes.c_int, ctypes.c_void_p])
+        self._error_handler = _X_ERROR_HANDLER(self._on_error)
+        self._failed = False
+
+    def trapped(self, display, function, *args):
+        """Calls ``function`` and waits for the X server, returning ``False`` if the call failed.
+
+        The default handler of Xlib exits the process on any error, so another
+        one is installed for the duration of the call. The previous handler,
+        e.g. the one of ``mss``, is restored afterwards.
+        """
+        with _x_error_lock:
+            self._failed = False
+            previous = self.x11.XSetErrorHandler(ctypes.cast(self._error_handler, ctypes.c_void_p))
+            try:
+                result = function(*args)
+                self.x11.XSync(display, 0)
+            finally:
+                self.x11.XSetErrorHandler(previous)
+            return bool(result) and not self._failed
+
+    def _on_error(self, display, event):
+        self._failed = True
+        return 0
+
+    @staticmethod
+    def _declare(library, name, restype, argtypes):
+        function = getattr(library, name)
+        function.restype = restype
+        function.argtypes = argtypes
+
+
+class _XShmImage(object):
+    """A shared memory segment that the X server copies grabs of one size into."""
+
+    def __init__(self, xlib, display, visual, depth, width, height):
+        self.xlib = xlib
+        self.display = display
+        self.info = _XShmSegmentInfo()
+        self.image = xlib.xext.XShmCreateImage(display, visual, depth, _Z_PIXMAP, None, ctypes.byref(self.info),
+                                               width, height)
+        if not self.image:
+            raise RuntimeError('Creating the MIT-SHM image failed.')
+        image = self.image.contents
+        if image.bits_per_pixel != 32:
+            xlib.x11.XFree(self.image)
+            raise RuntimeError('The xshm screenshot module needs a 24 or 32 bit display.')
+        size = image.bytes_per_line * height
+        self.info.shmid = xlib.libc.shmget(_IPC_PRIVATE, size, _IPC_CREAT | 0o600)
+        if self.info.shmid < 0:
+            xlib.x11.XFree(self.image)
+            raise RuntimeError('Creating the shared memory segment failed: %s' % os.strerror(ctypes.get_errno()))
+        self.info.shmaddr = image.data = xlib.libc.shmat(self.info.shmid, None, 0)
+        self.info.readOnly = 0
+        attached = self.info.shmaddr not in (None, ctypes.c_void_p(-1).value) and \
+            xlib.trapped(display, xlib.xext.XShmAttach, display, ctypes.byref(self.info))
+        # Removed once detached everywhere, also if the process dies.
+        xlib.libc.shmctl(self.info.shmid, _IPC_RMID, None)
+        if not attached:
+            self._free()
+            raise RuntimeError('Attaching the shared memory segment to the X server failed.')
+        buffer = (ctypes.c_uint8 * size).from_address(self.info.shmaddr)
+        self.pixels = np.ndarray((height, width, 4), dtype=np.uint8, buffer=buffer,
+                                 strides=(image.bytes_per_line, 4, 1))
+
+    def grab(self, root, left, top):
+        if not self.xlib.trapped(self.display, self.xlib.xext.XShmGetImage, self.display, root, self.image, left,
+                                 top, _ALL_PLANES):
+            raise RuntimeError('Grabbing the screen with MIT-SHM failed.')
+        return self.pixels
+
+    def close(self):
+        self.pixels = None
+        self.xlib.trapped(self.display, self.xlib.xext.XShmDetach, self.display, ctypes.byref(self.info))
+        self._free()
+
+    def _free(self):
+        if self.info.shmaddr not in (None, ctypes.c_void_p(-1).value):
+            self.xlib.libc.shmdt(self.info.shmaddr)
+        # The data is the shared memory, so only the image structure is freed.
+        self.image.contents.data = None
+        self.xlib.x11.XFree(self.image)
+
+
+class XShmBackend(CaptureBackend):
+    """Grabs an X11 display, e.g. Xvfb, through the MIT-SHM extension.
+
+    The X server writes every grab straight into a shared memory segment
+    instead of sending it over the socket. The segment is created once per
+    thread and grab size and reused for every following grab. The monitor
+    layout is taken from ``mss``.
+    """
+
+    name = 'xshm'
+    reuse_buffers = True
+
+    def __init__(self):
+        CaptureBackend.__init__(self)
+        self._xlib = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+
+    def monitor(self, index):
+        return capture_session.monitor(index)
+
+    def grab(self, monitor, out=None):
+        mon = self.monitor(monitor)
+        return self._grab(mon, out)
+
+    def grab_region(self, monitor, left, top, width, height, out=None):
+        return self._grab(clip_region(self.monitor(monitor), left, top, width, height), out)
+
+    def _grab(self, region, out):
+        connection = self._connection()
+        size = (region['width'], region['height'])
+        if size not in connection['images']:
+            connection['images'][size] = _XShmImage(self._xlib, connection['display'], connection['visual'],
+                                                    connection['depth'], *size)
+        pixels = connection['images'][size].grab(connection['root'], region['left'], region['top'])
+        # The segment is overwritten by the next grab, so callers always get a copy.
+        return pixels.copy() if out is None else _copy_to(pixels, out)
+
+    def _connection(self):
+        display_name = os.environ.get('DISPLAY')
+        connections = getattr(self._local, 'connections', None)
+        if connections is None:
+            connections = self._local.connections = {}
+        if display_name not in connections:
+            connections[display_name] = self._connect(display_name)
+        return connections[display_name]
+
+    def _connect(self, display_name):
+        with self._lock:
+            if self._xlib is None:
+                self._xlib = _XLib()
+        display = self._xlib.x11.XOpenDisplay(display_name.encode('utf-8') if display_name else None)
+        if not display:
+            raise RuntimeError("Opening the X11 display '%s' failed." % display_name)
+        if not self._xlib.xext.XShmQueryExtension(display):
+            self._xlib.x11.XCloseDisplay(display)
+            raise RuntimeError('The X11 display does not support the MIT-SHM extension.')
+        screen = self._xlib.x11.XDefaultScreen(display)
+        connection = {'display': display, 'root': self._xlib.x11.XRootWindow(display, screen),
+                      'visual': self._xlib.x11.XDefaultVisual(display, screen),
+                      'depth': self._xlib.x11.XDefaultDepth(display, screen), 'images': {}}
+        with self._lock:
+            self._connections.append(connection)
+        return connection
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            for image in connection['images'].values():
+                image.close()
+            self._xlib.x11.XCloseDisplay(connection['display'])
+        self._local = threading.local()
+
+
+BACKENDS = {
+    MssBackend.name: MssBackend,
+    PyGtkBackend.name: PyGtkBackend,
+    XShmBackend.name: XShmBackend,
+}
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def register_backend(backend_class):
+    """Makes ``backend_class``, a `CaptureBackend`, available as a ``screenshot_module``."""
+    BACKENDS[backend_class.name.lower()] = backend_class
+
+
+def get_backend(name):
+    """Returns the shared instance of the backend called ``name``, ``mss`` by default."""
+    name = (name or MssBackend.name).lower()
+    if name not in BACKENDS:
+        raise ValueError("Invalid screenshot module '%s'. Possible values are %s."
+                         % (name, ', '.join(sorted(BACKENDS))))
+    with _instances_lock:
+        if name not in _instances:
+            _instances[name] = BACKENDS[name]()
+        return _instances[name]
+
+
+def close_backends():
+    with _instances_lock:
+        backends = list(_instances.values())
+    for backend in backends:
+        backend.close()
@@ -0,0 +1,208 @@
+#  Copyright 2008-2015 Nokia Networks
+#  Copyright 2016-     Robot Framework Foundation
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import itertools
+import os
+import threading
+
+from .utils import LazyModule, monotonic, np
+
+mss = LazyModule('mss')
+
+
+def clip_region(mon, left, top, width, height):
+    """Returns the absolute rectangle of a region given relative to monitor ``mon``, clipped to it."""
+    if not 0 <= left < mon['width'] or not 0 <= top < mon['height']:
+        raise SystemError("Top and left parameters must be lower than screen resolution.")
+    return {'left': mon['left'] + left, 'top': mon['top'] + top,
+            'width': min(width, mon['width'] - left), 'height': min(height, mon['height'] - top)}
+
+
+class CaptureSession(object):
+    """Keeps one long-lived ``mss`` grabber per thread and display.
+
+    Opening ``mss()`` connects to the display server and queries the
+    monitor layout, which costs more than grabbing a frame. The grabbers
+    are not thread safe, so each thread gets its own one which is reused
+    for every following grab. Monitor geometry is cached together with it.
+    Grabbers are created by calling ``factory``, ``mss.mss`` by default,
+    which benchmarks can replace with a synthetic screen.
+    """
+
+    def __init__(self, factory=None):
+        self.factory = factory
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._grabbers = []
+
+    @property
+    def _display(self):
+        return os.environ.get('DISPLAY')
+
+    def _get_entry(self):
+        entries = getattr(self._local, 'entries', None)
+        if entries is None:
+            entries = self._local.entries = {}
+        entry = entries.get(self._display)
+        if entry is None:
+            sct = self.factory() if self.factory else mss.mss()
+            entry = entries[self._display] = {'sct': sct, 'monitors': sct.monitors}
+            with self._lock:
+                self._grabbers.append(sct)
+        return entry
+
+    @property
+    def grabber(self):
+        return self._get_entry()['sct']
+
+    @property
+    def monitors(self):
+        return self._get_entry()['monitors']
+
+    def monitor(self, index):
+        try:
+            return self.monitors[int(index)]
+        except IndexError:
+            raise RuntimeError('Monitor not available.')
+
+    def size(self, monitor):
+        mon = self.monitor(monitor)
+        return mon['width'], mon['height']
+
+    def grab(self, monitor):
+        return self.grabber.grab(self.monitor(monitor))
+
+    def grab_region(self, monitor, left, top, width, height):
+        """Grabs only the given rectangle, relative to the monitor and clipped to it."""
+        return self.grabber.grab(clip_region(self.monitor(monitor), left, top, width, height))
+
+    def close(self):
+        """Closes the grabbers of the current thread."""
+        entries = getattr(self._local, 'entries', None) or {}
+        for entry in entries.values():
+            self._close_grabber(entry['sct'])
+        entries.clear()
+
+    def close_all(self):
+        """Closes every grabber opened by this session, in all threads."""
+        with self._lock:
+            grabbers = self._grabbers[:]
+        for sct in grabbers:
+            self._close_grabber(sct)
+        self._local = threading.local()
+
+    def _close_grabber(self, sct):
+        with self._lock:
+            if sct in self._grabbers:
+                self._grabbers.remove(sct)
+        try:
+            sct.close()
+        except Exception:
+            pass
+
+
+class CaptureHub(object):
+    """Shares the screen grabs of recordings that run at the same time.
+
+    Every recording subscribes with its monitor and frame rate. A grab that a
+    subscriber has not got yet is handed to it instead of grabbing again, as
+    long as it is younger than one frame interval of the fastest recording,
+    so concurrent recordings of the same screen cause one grab per tick.
+    While all monitors (monitor 0) are recorded, the other monitors are
+    cropped from that grab instead of being grabbed separately. Grabs are
+    returned as BGRA arrays, which must not be modified.
+
+    Backends with ``reuse_buffers`` grab into buffers the hub recycles once
+    no subscriber holds them anymore. A subscriber holds its latest grab and
+    the one before, which e.g. a `ChangeDetector` compares it with.
+    """
+
+    def __init__(self, backend):
+        self._backend = backend
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._subscribers = {}
+        self._latest = {}
+        self._grab_locks = {}
+        self._buffers = {}
+
+    def subscribe(self, monitor, fps=None):
+        with self._lock:
+            subscription = next(self._ids)
+            self._subscribers[subscription] = {'monitor': int(monitor), 'fps': fps, 'seen': None, 'previous': None}
+            return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.pop(subscription, None)
+            if not self._subscribers:
+                self._latest.clear()
+                self._buffers.clear()
+
+    def grab(self, subscription, monitor):
+        monitor = int(monitor)
+        with self._lock:
+            subscriber = self._subscribers[subscription]
+            all_monitors = any(other['monitor'] == 0 for other in self._subscribers.values())
+            source = 0 if all_monitors else monitor
+            grab_lock = self._grab_locks.setdefault(source, threading.Lock())
+        # Waiting for another recording grabbing the same source lets this one reuse its grab.
+        with grab_lock:
+            with self._lock:
+                latest = self._latest.get(source)
+                fresh = (latest is not None and latest is not subscriber['seen']
+                         and monotonic() - latest[0] < self._max_age())
+            if not fresh:
+                latest = (monotonic(), self._backend.grab(source, self._free_buffer(source)))
+                with self._lock:
+                    self._latest[source] = latest
+            subscriber['previous'], subscriber['seen'] = subscriber['seen'], latest
+        pixels = latest[1]
+        if source != monitor:
+            pixels = self._crop(pixels, monitor)
+        return pixels
+
+    def _free_buffer(self, source):
+        if not getattr(self._backend, 'reuse_buffers', False):
+            return None
+        width, height = self._backend.size(source)
+        shape = (height, width, 4)
+        with self._lock:
+            held = [self._latest.get(source)]
+            for subscriber in self._subscribers.values():
+                held.extend((subscriber['seen'], subscriber['previous']))
+            held = [grab[1] for grab in held if grab]
+            buffers = self._buffers.setdefault(source, [])
+            buffers[:] = [buffer for buffer in buffers if buffer.shape == shape]
+            for buffer in buffers:
+                if not any(buffer is pixels for pixels in held):
+                    return buffer
+            buffer = np.empty(shape, dtype=np.uint8)
+            buffers.append(buffer)
+            return buffer
+
+    def _max_age(self):
+        rates = [subscriber['fps'] for subscriber in self._subscribers.values() if subscriber['fps']]
+        return 1.0 / max(rates) if rates else 0
+
+    def _crop(self, pixels, monitor):
+        screen = self._backend.monitor(0)
+        mon = self._backend.monitor(monitor)
+        left = mon['left'] - screen['left']
+        top = mon['top'] - screen['top']
+        return pixels[top:top + mon['height'], left:left + mon['width']]
+
+
+capture_session = CaptureSession()
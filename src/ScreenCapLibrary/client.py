@@ -14,58 +14,61 @@
 #  limitations under the License.
 
 import os
+import multiprocessing
 import time
 import threading
 import base64
 
-try:
-    import cv2
-    import numpy as np
-except ImportError:
-    raise ImportError('Importing cv2 failed. Make sure you have opencv-python installed.')
-
-from mss import mss
-from PIL import Image
+from io import BytesIO
 from functools import wraps
 from robot.api import logger
 from robot.utils import get_link_path, abspath, timestr_to_secs, is_truthy
 from robot.libraries.BuiltIn import BuiltIn
-from .pygtk import _take_gtk_screenshot, _take_partial_gtk_screenshot, _take_gtk_screen_size, _grab_gtk_pb
-from .utils import _norm_path, _compression_value_conversion, _pil_quality_conversion, is_pygtk
+from .backends import get_backend, to_image
+from .encoders import VIDEO_EXTENSIONS
+from .executor import background_executor
+from .paths import path_allocator
+from .utils import _norm_path, _compression_value_conversion, _pil_quality_conversion, _pil_format_and_quality
 
-from concurrent.futures import ThreadPoolExecutor
-from concurrent.futures.thread import _threads_queues
+ENCODER_WORKERS = min(4, multiprocessing.cpu_count())
 
 
 def run_in_background(f):
     @wraps(f)
     def wrap(*args, **kwargs):
-        return ThreadPoolExecutor().submit(f, *args, **kwargs)
+        return background_executor.submit(f, *args, **kwargs)
     return wrap
 
 
 class Client:
 
     def __init__(self, screenshot_module=None, screenshot_directory=None, format='png', quality=50, delay=0,
-                 display_cursor=False):
+                 display_cursor=False, fps_cache_ttl=0):
         self.screenshot_module = screenshot_module
+        # Fails early for an unknown module.
+        get_backend(screenshot_module)
         self._given_screenshot_dir = _norm_path(screenshot_directory)
         self._format = format
         self._quality = quality
         self._delay = delay
         self._display_cursor = display_cursor
-        self.frames = []
+        self.fps_cache_ttl = timestr_to_secs(fps_cache_ttl)
         self.name = 'screenshot'
         self.path = None
         self.embed = False
         self.embed_width = None
         self._stop_condition = threading.Event()
         self.futures = None
+        self._pending_screenshots = []
 
     @property
     def cursor(self):
         return self._display_cursor
 
+    @property
+    def backend(self):
+        return get_backend(self.screenshot_module)
+
     @property
     def screenshot_dir(self):
         return self._given_screenshot_dir or self._log_dir
@@ -88,14 +91,9 @@ class Client:
 
     def _get_screenshot_path(self, basename, format, directory):
         directory = _norm_path(directory) if directory else self.screenshot_dir
-        if basename.lower().endswith(('.jpg', '.jpeg', '.png', '.webp', '.webm')):
+        if basename.lower().endswith(('.jpg', '.jpeg', '.png', '.webp') + VIDEO_EXTENSIONS):
             return os.path.join(directory, basename)
-        index = 0
-        while True:
-            index += 1
-            path = os.path.join(directory, "%s_%d.%s" % (basename, index, format))
-            if not os.path.exists(path):
-                return path
+        return path_allocator.allocate(directory, basename, format)
 
     @staticmethod
     def _validate_screenshot_path(path):
@@ -109,53 +107,67 @@ class Client:
         path = self._get_screenshot_path(basename, format, self.screenshot_dir)
         return self._validate_screenshot_path(path)
 
-    def take_screenshot(self, name, format, quality, width, delay, monitor, save_to_disk):
+    def take_screenshot(self, name, format, quality, width, delay, monitor, save_to_disk, wait=True):
         delay = delay or self._delay
         if delay:
             time.sleep(timestr_to_secs(delay))
+        if not is_truthy(wait):
+            return self._take_screenshot_in_background(name, format, quality, width, monitor, save_to_disk)
+        if not save_to_disk:
+            return self._take_screenshot_in_memory(name, format, quality, width, monitor)
         path = self._take_screenshot_client(name, format, quality, monitor)
         self._embed_screenshot(path, width, save_to_disk)
         return path
 
-    def _take_screenshot_client(self, name, format, quality, monitor):
+    def _take_screenshot_in_memory(self, name, format, quality, width, monitor):
         format = (format or self._format).lower()
-        quality = quality or self._quality
-        if is_pygtk(self.screenshot_module):
-            return self._take_screenshot_client_gtk(name, format, quality, monitor)
-        else:
-            return self._take_screenshot_client_mss(name, format, quality, monitor)
+        # Nothing is written, the path is returned like for screenshots saved to disk.
+        path = self._save_screenshot_path(name, format)
+        format, quality = _pil_format_and_quality(format, quality or self._quality)
+        self._embed_image(self._encode_image(self._grab_image(monitor), format, quality), format, width)
+        return path
 
-    def _take_screenshot_client_gtk(self, name, format, quality, monitor):
-        format = 'jpeg' if format == 'jpg' else format
-        if format == 'png':
-            quality = _compression_value_conversion(quality)
+    def _take_screenshot_in_background(self, name, format, quality, width, monitor, save_to_disk):
+        format = (format or self._format).lower()
+        # Validated before an index is allocated, but the path keeps the given extension, e.g. ``jpg``.
+        pil_format, quality = _pil_format_and_quality(format, quality or self._quality)
         path = self._save_screenshot_path(name, format)
-        if format == 'webp':
-            png_img = _take_gtk_screenshot(path, 'png', _compression_value_conversion(100), monitor)
-            im = Image.open(png_img)
-            im.save(path, format, quality=quality)
-            return path
-        return _take_gtk_screenshot(path, format, quality, monitor)
-
-    def _take_screenshot_client_mss(self, name, format, quality, monitor):
-        if format in ['jpg', 'jpeg', 'webp']:
-            with mss() as sct:
-                sct_img = sct.grab(sct.monitors[int(monitor)])
-                img = Image.frombytes('RGB', sct_img.size, sct_img.bgra, 'raw', 'BGRX')
-                path = self._save_screenshot_path(name, format)
-                img.save(path, quality=quality if format == 'webp' else _pil_quality_conversion(quality))
-            return path
-        elif format == 'png':
-            with mss() as sct:
-                path_name = self._save_screenshot_path(name, format)
-                sct.compression_level = _compression_value_conversion(quality)
-                path = sct.shot(mon=-1, output='%s' % path_name)
-            return path
+        img = self._grab_image(monitor)
+        if save_to_disk:
+            future = background_executor.submit(self._save_image, img, path, pil_format, quality)
+            # Only links to the file, which can be done before it is written.
+            self._embed_screenshot(path, width, save_to_disk)
         else:
-            raise RuntimeError("Invalid screenshot format.")
+            future = background_executor.submit(self._encode_image, img, pil_format, quality)
+        self._pending_screenshots.append((future, path, width, save_to_disk, pil_format))
+        return path
+
+    def wait_for_pending_screenshots(self):
+        pending, self._pending_screenshots = self._pending_screenshots, []
+        # A failed screenshot must not lose the others, so all are finished before the first error is raised.
+        errors = []
+        for future, path, width, save_to_disk, format in pending:
+            try:
+                data = future.result()
+            except Exception as error:
+                errors.append(error)
+                continue
+            if not save_to_disk:
+                self._embed_image(data, format, width)
+        if errors:
+            raise errors[0]
+        return [path for _, path, _, _, _ in pending]
+
+    def _take_screenshot_client(self, name, format, quality, monitor):
+        format = (format or self._format).lower()
+        quality = quality or self._quality
+        # Fails for an invalid format before anything is grabbed.
+        _pil_format_and_quality(format, quality)
+        path = self._save_screenshot_path(name, format)
+        self.backend.save(path, format, quality, int(monitor))
+        return path
 
     def take_multiple_screenshots(self, name, format, quality, screenshot_number, delay_time, monitor):
-        del self.frames[:]
         quality = quality or self._quality
         format = (format or self._format).lower()
         format = 'jpeg' if format == 'jpg' else format
@@ -164,38 +176,49 @@ class Client:
         elif format == 'jpeg':
             quality = _pil_quality_conversion(quality)
         delay_time = timestr_to_secs(delay_time)
-        self._take_multiple_screenshots(name, format, quality, delay=delay_time, shot_number=int(screenshot_number),
-                                        monitor=monitor)
+        paths = [self._save_screenshot_path(name, format) for _ in range(int(screenshot_number))]
+        self.futures = self._take_multiple_screenshots(paths, format, quality, delay=delay_time, monitor=monitor)
+        return paths
 
     @run_in_background
-    def _take_multiple_screenshots(self, name, format, quality, delay, shot_number, monitor):
-        if is_pygtk(self.screenshot_module):
-            self._take_multiple_screenshots_gtk(delay, shot_number, monitor)
-        else:
-            self._take_multiple_screenshots_mss(delay, shot_number, monitor)
-        for img in self.frames:
-            path = self._save_screenshot_path(basename=name, format=format)
-            img.save(path, format=format, quality=quality, compress_level=quality)
-
-    def _take_multiple_screenshots_mss(self, delay, shot_number, monitor):
-        taken = 0
-        with mss() as sct:
-            while taken < shot_number:
-                sct_img = sct.grab(sct.monitors[int(monitor)])
-                img = Image.frombytes('RGB', sct_img.size, sct_img.bgra, 'raw', 'BGRX')
-                self.frames.append(img)
-                time.sleep(timestr_to_secs(delay))
-                taken += 1
-
-    def _take_multiple_screenshots_gtk(self, delay, shot_number, monitor):
-        taken = 0
-        width, height = _take_gtk_screen_size(monitor)
-        while taken < shot_number:
-            pb = _grab_gtk_pb(monitor)
-            img = Image.frombuffer('RGB', (width, height), pb.get_pixels(), 'raw', 'RGB')
-            self.frames.append(img)
-            time.sleep(timestr_to_secs(delay))
-            taken += 1
+    def _take_multiple_screenshots(self, paths, format, quality, delay, monitor):
+        # Frames are saved while the following ones are captured. Waiting for a free slot
+        # in the window keeps at most that many full-resolution images in memory.
+        window = threading.BoundedSemaphore(2 * ENCODER_WORKERS)
+        futures = []
+        for index, path in enumerate(paths):
+            if index:
+                time.sleep(delay)
+            window.acquire()
+            img = self._grab_image(monitor)
+            future = background_executor.try_submit(self._save_image, img, path, format, quality)
+            if future is None:
+                # All workers are busy, so the image is saved here before taking the next one.
+                try:
+                    self._save_image(img, path, format, quality)
+                finally:
+                    window.release()
+                continue
+            future.add_done_callback(lambda _: window.release())
+            futures.append(future)
+        for future in futures:
+            future.result()
+
+    @staticmethod
+    def _save_image(img, path, format, quality):
+        img.save(path, format=format, quality=quality, compress_level=quality)
+
+    @classmethod
+    def _encode_image(cls, img, format, quality):
+        output = BytesIO()
+        cls._save_image(img, output, format, quality)
+        return output.getvalue()
+
+    def _grab_image(self, monitor):
+        return to_image(self.backend.grab(int(monitor)))
+
+    def _grab_partial_image(self, monitor, left, top, width, height):
+        return to_image(self.backend.grab_region(monitor, left, top, width, height))
 
     def take_partial_screenshot(self, name, format, quality,
                                 left, top, width, height, embed, embed_width, monitor, save_to_disk):
@@ -203,32 +226,19 @@ class Client:
         top = int(top)
         width = int(width)
         height = int(height)
+        monitor = int(monitor)
         format = (format or self._format).lower()
         quality = quality or self._quality
 
-        if is_pygtk(self.screenshot_module):
-            format = 'jpeg' if format == 'jpg' else format
-            if format == 'png':
-                quality = _compression_value_conversion(quality)
+        if is_truthy(embed) and not save_to_disk:
             path = self._save_screenshot_path(name, format)
-            path = _take_partial_gtk_screenshot(path, format, quality, left, top, width, height, monitor)
-        else:
-            try:
-                original_image = self._take_screenshot_client(name, format, quality, monitor)
-                image = Image.open(original_image)
-                right = left + width
-                bottom = top + height
-                box = (left, top, right, bottom)
-                cropped_image = image.crop(box)
-                os.remove(original_image)
-                path = self._save_screenshot_path(basename=name, format=format)
-                cropped_image.save(path, format)
-            except IOError:
-                raise IOError('File not found.')
-            except RuntimeError:
-                raise RuntimeError('Taking screenshot failed.')
-            except SystemError:
-                raise SystemError("Top and left parameters must be lower than screen resolution.")
+            pil_format, pil_quality = _pil_format_and_quality(format, quality)
+            img = self._grab_partial_image(monitor, left, top, width, height)
+            self._embed_image(self._encode_image(img, pil_format, pil_quality), pil_format, embed_width)
+            return path
+        _pil_format_and_quality(format, quality)
+        path = self._save_screenshot_path(name, format)
+        self.backend.save_region(path, format, quality, monitor, left, top, width, height)
         if is_truthy(embed):
             self._embed_screenshot(path, embed_width, save_to_disk)
         return path
@@ -244,12 +254,6 @@ class Client:
     def _stop_thread(self):
         self._stop_condition.set()
         self.futures.result()
-        if self.futures._exception:
-            raise self.futures._exception
-
-    @staticmethod
-    def clear_thread_queues():
-        _threads_queues.clear()
 
     def _embed_screenshot(self, path, width, save_to_disk):
         link = get_link_path(path, self._log_dir)
@@ -257,9 +261,13 @@ class Client:
             logger.info('<a href="%s"><img src="%s" width="%s"></a>' % (link, link, width), html=True)
         else:
             with open(path, "rb") as image_file:
-                logger.info('<img src="data:image/png;base64, %s" width="%s">' % ((base64.b64encode(image_file.read())).decode("utf-8"), width), html=True)
+                self._embed_image(image_file.read(), 'png', width)
             os.remove(path)
 
+    @staticmethod
+    def _embed_image(data, format, width):
+        logger.info('<img src="data:image/%s;base64, %s" width="%s">' % (format, base64.b64encode(data).decode("utf-8"), width), html=True)
+
     def _link_screenshot(self, path):
         link = get_link_path(path, self._log_dir)
         logger.info("Screenshot saved to '<a href=\"%s\">%s</a>'." % (link, path), html=True)
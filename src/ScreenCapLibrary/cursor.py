@@ -0,0 +1,138 @@
+#  Copyright 2008-2015 Nokia Networks
+#  Copyright 2016-     Robot Framework Foundation
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import threading
+
+from .utils import LazyModule, cv2, np
+
+pyautogui = LazyModule('pyautogui')
+
+# The outline of the drawn arrow, its tip at the pointer position.
+CURSOR_POINTS = [(0, 0), (8, 2), (6, 4), (14, 12), (12, 14), (4, 6), (2, 8), (0, 0)]
+CURSOR_COLOR = (0, 255, 255)
+
+
+def _pointer_position():
+    return tuple(pyautogui.position())
+
+
+class CursorSampler(object):
+    """Samples the mouse pointer position on a background thread.
+
+    Asking the windowing system for the position takes far longer than
+    drawing the cursor, so recordings read the latest sample instead of
+    asking on every frame. The thread runs while any recording uses the
+    sampler, taking ``rate`` samples per second. ``position`` returns the
+    pointer position, which tests and benchmarks can replace.
+    """
+
+    def __init__(self, rate=60, position=_pointer_position):
+        self.interval = 1.0 / rate
+        self.position_function = position
+        self._position = None
+        self._users = 0
+        self._lock = threading.Lock()
+        self._stop = None
+
+    @property
+    def position(self):
+        """The latest ``(x, y)`` pointer position, ``None`` if it is not sampled."""
+        return self._position
+
+    def acquire(self):
+        with self._lock:
+            if not self._users:
+                # The first frame needs a position already.
+                self._position = self.position_function()
+                self._stop = threading.Event()
+                thread = threading.Thread(target=self._sample, args=(self._stop,), name='CursorSampler')
+                thread.daemon = True
+                thread.start()
+            self._users += 1
+
+    def release(self):
+        with self._lock:
+            self._users -= 1
+            if not self._users:
+                self._stop.set()
+                self._position = None
+
+    def _sample(self, stop):
+        while not stop.wait(self.interval):
+            try:
+                position = self.position_function()
+            except Exception:
+                # E.g. the display went away; the cursor keeps its last position.
+                continue
+            if not stop.is_set():
+                self._position = position
+
+
+cursor_sampler = CursorSampler()
+
+
+class CursorOverlay(object):
+    """Draws the sampled pointer position over the frames of one recording.
+
+    The cursor polygon is built once and only moved by OpenCV when it is
+    drawn, which takes a few microseconds per frame. The pointer position
+    on the screen is mapped to the frame, which shows ``monitor`` scaled to
+    ``size``. Frames are BGR, or RGB with ``rgb``. Use the overlay as a
+    context manager to sample the pointer position while recording.
+    """
+
+    def __init__(self, monitor, size, rgb=False, sampler=None):
+        self.sampler = sampler or cursor_sampler
+        self._left, self._top = monitor['left'], monitor['top']
+        self._scale_x = size[0] / float(monitor['width'])
+        self._scale_y = size[1] / float(monitor['height'])
+        self._color = CURSOR_COLOR[::-1] if rgb else CURSOR_COLOR
+        self._polygons = [np.array(CURSOR_POINTS, dtype=np.int32)]
+
+    def __enter__(self):
+        self.sampler.acquire()
+        return self
+
+    def __exit__(self, *_):
+        self.sampler.release()
+
+    @property
+    def position(self):
+        return self.sampler.position
+
+    def draw(self, frame, position):
+        """Draws the cursor at the screen ``position`` into ``frame`` in place."""
+        if position is None:
+            return
+        offset = (int((position[0] - self._left) * self._scale_x), int((position[1] - self._top) * self._scale_y))
+        # OpenCV clips the parts of the cursor outside the frame.
+        cv2.fillPoly(frame, self._polygons, self._color, offset=offset)
+
+
+class NoCursor(object):
+    """Stands in for a `CursorOverlay` in recordings without the cursor."""
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *_):
+        pass
+
+
+def cursor_overlay(display_cursor, backend, monitor, size, rgb=False):
+    """Returns the overlay for a recording of ``monitor`` grabbed with ``backend``."""
+    if not display_cursor:
+        return NoCursor()
+    return CursorOverlay(backend.monitor(monitor), size, rgb)
@@ -0,0 +1,183 @@
+#  Copyright 2008-2015 Nokia Networks
+#  Copyright 2016-     Robot Framework Foundation
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import multiprocessing
+import os
+import shlex
+import subprocess
+import tempfile
+
+from .utils import cv2, suppress_stderr
+
+try:
+    from shutil import which
+except ImportError:
+    from distutils.spawn import find_executable as which
+
+FFMPEG_ENV = 'SCREENCAPLIBRARY_FFMPEG'
+
+
+class VideoEncoder(object):
+    """A codec that ``cv2.VideoWriter`` encodes with, and the container it is written to.
+
+    Every codec always uses the same container, so the file extension tells
+    how a recording was encoded.
+    """
+
+    def __init__(self, name, fourcc, extension, mime_type):
+        self.name = name
+        self.fourcc = fourcc
+        self.extension = extension
+        self.mime_type = mime_type
+
+    def open(self, path, fps, size):
+        fourcc = cv2.VideoWriter_fourcc(*self.fourcc) if self.fourcc else 0
+        with suppress_stderr():
+            writer = cv2.VideoWriter(path, fourcc, fps, size)
+        if not writer.isOpened():
+            raise RuntimeError("Video encoder '%s' is not supported by the installed OpenCV." % self.name)
+        return writer
+
+
+class FfmpegEncoder(VideoEncoder):
+    """Pipes the raw frames to an ``ffmpeg`` process that encodes them.
+
+    The encoding runs outside of Python on as many threads as ``ffmpeg``
+    wants, so it neither competes with the capture for the GIL nor is limited
+    to one core. ``ffmpeg`` is searched from ``PATH`` unless the environment
+    variable ``SCREENCAPLIBRARY_FFMPEG`` points to it. The variable may also
+    contain a command line, e.g. an interpreter and the script it runs.
+    ``ffmpeg`` reports an unsupported ``codec`` only once it gets the first
+    frame, so the codecs it supports are checked when the writer is opened.
+    """
+
+    def __init__(self, name, codec, codec_options, extension, mime_type):
+        VideoEncoder.__init__(self, name, None, extension, mime_type)
+        self.codec = codec
+        self.codec_options = ['-c:v', codec] + codec_options
+
+    def open(self, path, fps, size):
+        ffmpeg = _ffmpeg_command()
+        if not ffmpeg:
+            raise RuntimeError("Video encoder '%s' needs ffmpeg, which was not found." % self.name)
+        if self.codec not in _ffmpeg_codecs(ffmpeg):
+            raise RuntimeError("Video encoder '%s' needs the codec '%s', which the installed ffmpeg does not "
+                               "support." % (self.name, self.codec))
+        # Frames are BGR like for cv2.VideoWriter. The encoders need even dimensions.
+        command = ffmpeg + ['-y', '-loglevel', 'error',
+                   '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', '%dx%d' % size, '-r', str(fps), '-i', '-',
+                   '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-pix_fmt', 'yuv420p'] + self.codec_options + [path]
+        return FfmpegWriter(command)
+
+
+def _ffmpeg_command():
+    command = os.environ.get(FFMPEG_ENV)
+    if not command:
+        ffmpeg = which('ffmpeg')
+        return [ffmpeg] if ffmpeg else None
+    if os.path.isfile(command):
+        return [command]
+    # Windows paths are split without treating backslashes as escapes.
+    return [part.strip('"') for part in shlex.split(command, posix=os.name != 'nt')]
+
+
+_codecs = {}
+
+
+def _ffmpeg_codecs(ffmpeg):
+    """Returns the names of the encoders ``ffmpeg`` supports. They are listed only once per command."""
+    key = tuple(ffmpeg)
+    if key not in _codecs:
+        with open(os.devnull, 'r+b') as devnull:
+            try:
+                output = subprocess.check_output(ffmpeg + ['-hide_banner', '-encoders'], stdin=devnull,
+                                                 stderr=devnull)
+            except (OSError, subprocess.CalledProcessError) as error:
+                raise RuntimeError('Starting ffmpeg failed: %s' % error)
+        # The lines look like ' V....D libx264  libx264 H.264 / AVC / MPEG-4 AVC'.
+        _codecs[key] = set(line.split()[1] for line in output.decode('utf-8', 'replace').splitlines()
+                           if len(line.split()) > 1)
+    return _codecs[key]
+
+
+class FfmpegWriter(object):
+    """Writes frames to an ``ffmpeg`` process like ``cv2.VideoWriter`` writes them to a file."""
+
+    def __init__(self, command):
+        self._output = tempfile.TemporaryFile()
+        try:
+            self._process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=self._output,
+                                             stderr=self._output)
+        except OSError as error:
+            self._output.close()
+            raise RuntimeError('Starting ffmpeg failed: %s' % error)
+
+    def isOpened(self):
+        return self._process.poll() is None
+
+    def write(self, frame):
+        try:
+            self._process.stdin.write(frame.data)
+        except (IOError, OSError):
+            self.release()
+            raise RuntimeError('ffmpeg stopped reading frames.')
+
+    def release(self):
+        if self._process.stdin.closed:
+            return
+        try:
+            self._process.stdin.close()
+        except (IOError, OSError):
+            pass
+        returncode = self._process.wait()
+        self._output.seek(0)
+        output = self._output.read().decode('utf-8', 'replace').strip()
+        self._output.close()
+        if returncode:
+            raise RuntimeError('ffmpeg failed with exit code %d: %s' % (returncode, output))
+
+
+VP8 = 'vp8'
+
+ENCODERS = dict((encoder.name, encoder) for encoder in [
+    VideoEncoder(VP8, 'VP08', 'webm', 'video/webm'),
+    VideoEncoder('mp4v', 'mp4v', 'mp4', 'video/mp4'),
+    VideoEncoder('mjpg', 'MJPG', 'avi', 'video/x-msvideo'),
+    VideoEncoder('ffv1', 'FFV1', 'mkv', 'video/x-matroska'),
+    VideoEncoder('raw', None, 'avi', 'video/x-msvideo'),
+    FfmpegEncoder('ffmpeg-h264', 'libx264', ['-preset', 'ultrafast', '-threads', '0'], 'mp4', 'video/mp4'),
+    FfmpegEncoder('ffmpeg-vp8', 'libvpx', ['-deadline', 'realtime', '-cpu-used', '8', '-b:v', '4M',
+                                           '-threads', str(multiprocessing.cpu_count())],
+                  'webm', 'video/webm'),
+])
+
+# Aliases name an encoder by what matters most for the recording. They only select the
+# encoder, which is used with its own settings.
+ALIASES = {
+    'small': VP8,
+    'fast': 'mp4v',
+    'lossless': 'ffv1',
+}
+
+VIDEO_EXTENSIONS = tuple(sorted(set('.%s' % encoder.extension for encoder in ENCODERS.values())))
+
+
+def get_encoder(name):
+    name = (name or VP8).lower()
+    name = ALIASES.get(name, name)
+    if name not in ENCODERS:
+        raise ValueError("Invalid video encoder '%s'. Possible values are %s."
+                         % (name, ', '.join(sorted(ENCODERS) + sorted(ALIASES))))
+    return ENCODERS[name]
@@ -0,0 +1,142 @@
+#  Copyright 2008-2015 Nokia Networks
+#  Copyright 2016-     Robot Framework Foundation
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import threading
+
+from collections import deque
+from concurrent.futures import Future
+
+from .utils import monotonic
+
+
+class BackgroundExecutor(object):
+    """Runs all background work of the library on one shared pool of threads.
+
+    Worker threads are started when needed and reused afterwards. At most
+    ``max_workers`` tasks run at the same time. When all of them are busy,
+    ``submit`` waits up to ``timeout`` seconds for one to finish and then
+    fails, while ``try_submit`` returns ``None`` right away so that callers
+    can do the work themselves.
+
+    The workers are daemon threads. A recording that is never stopped must
+    not keep the process alive, so the library stops the remaining work and
+    waits for it with ``drain`` once the tests have run, and calls
+    ``shutdown`` itself when the process exits.
+    """
+
+    def __init__(self, max_workers=16, timeout=10):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._tasks = deque()
+        self._workers = []
+        self._busy = 0
+        self._shutdown = False
+        self._configured = False
+        self._condition = threading.Condition()
+
+    def configure(self, max_workers):
+        """Sets ``max_workers``, which only the first call does.
+
+        The executor is shared by every instance of the library, which is
+        created again e.g. for every test, so later calls only validate the
+        value instead of resizing the pool while it is used.
+        """
+        try:
+            max_workers = int(max_workers)
+        except ValueError:
+            raise ValueError('The background workers argument must be of type integer.')
+        if max_workers < 1:
+            raise ValueError('The number of background workers must be greater than 0.')
+        with self._condition:
+            if self._configured:
+                return
+            self._configured = True
+            self.max_workers = max_workers
+            self._condition.notify_all()
+
+    def submit(self, fn, *args, **kwargs):
+        future = self._submit(fn, args, kwargs, self.timeout)
+        if future is None:
+            raise RuntimeError('All %d background workers are busy.' % self.max_workers)
+        return future
+
+    def try_submit(self, fn, *args, **kwargs):
+        return self._submit(fn, args, kwargs, 0)
+
+    def _submit(self, fn, args, kwargs, timeout):
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError('The background executor has been shut down.')
+            deadline = monotonic() + timeout
+            while self._busy >= self.max_workers:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+            future = Future()
+            self._tasks.append((future, fn, args, kwargs))
+            self._busy += 1
+            if len(self._workers) < self._busy:
+                worker = threading.Thread(target=self._work, name='ScreenCapLibrary-%d' % len(self._workers))
+                worker.daemon = True
+                self._workers.append(worker)
+                worker.start()
+            self._condition.notify_all()
+            return future
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while not self._tasks and not self._shutdown:
+                    self._condition.wait()
+                if not self._tasks:
+                    self._workers.remove(threading.current_thread())
+                    return
+                future, fn, args, kwargs = self._tasks.popleft()
+            if future.set_running_or_notify_cancel():
+                try:
+                    result = fn(*args, **kwargs)
+                except BaseException as error:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+            with self._condition:
+                self._busy -= 1
+                self._condition.notify_all()
+
+    def drain(self, timeout=None):
+        """Waits until the submitted tasks have finished and returns whether they did in time."""
+        deadline = monotonic() + timeout if timeout is not None else None
+        with self._condition:
+            while self._busy:
+                remaining = deadline - monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            return True
+
+    def shutdown(self, wait=True, timeout=None):
+        """Lets the workers finish the submitted tasks and exit."""
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify_all()
+            workers = self._workers[:]
+        if wait:
+            deadline = monotonic() + timeout if timeout is not None else None
+            for worker in workers:
+                worker.join(max(deadline - monotonic(), 0) if deadline is not None else None)
+
+
+background_executor = BackgroundExecutor()
@@ -0,0 +1,144 @@
+#  Copyright 2008-2015 Nokia Networks
+#  Copyright 2016-     Robot Framework Foundation
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import threading
+
+from collections import deque
+
+from robot.utils import is_truthy, timestr_to_secs
+
+from .pipeline import norm_pipeline_options
+from .utils import cv2, np
+from .videoclient import VideoClient
+
+
+class FrameRing(object):
+    """Keeps the last frames of a recording as JPEG images in memory.
+
+    It is written to like a video writer, but only the frames covering the
+    last ``length`` frames of the video are kept. Each frame is stored once
+    with the number of times it is repeated in the video.
+    """
+
+    def __init__(self, length, quality=80):
+        self.length = length
+        self.quality = quality
+        self.fps = None
+        self.size = None
+        self._frames = deque()
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def open(self, path, fps, size):
+        self.fps = fps
+        self.size = size
+        return self
+
+    def write(self, frame):
+        self.write_repeated(frame, 1)
+
+    def write_repeated(self, frame, repeat):
+        _, data = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        with self._lock:
+            self._frames.append((data, repeat))
+            self._add(repeat)
+
+    def repeat(self, repeat):
+        """Repeats the last frame without compressing it again."""
+        with self._lock:
+            data, count = self._frames.pop()
+            self._frames.append((data, count + repeat))
+            self._add(repeat)
+
+    def _add(self, repeat):
+        self._count += repeat
+        while self._count - self._frames[0][1] >= self.length:
+            self._count -= self._frames.popleft()[1]
+        if self._count > self.length:
+            # Only the newest repeats of the oldest frame still fit.
+            data, count = self._frames.popleft()
+            self._frames.appendleft((data, count - self._count + self.length))
+            self._count = self.length
+
+    def release(self):
+        pass
+
+    def frames(self):
+        """Returns the stored frames and their repeat counts, oldest first."""
+        with self._lock:
+            return list(self._frames)
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self._count = 0
+
+
+class FlightRecorder(VideoClient):
+    """Records the screen all the time but keeps only the last ``duration`` in memory.
+
+    The frames are compressed and kept in a `FrameRing`. A video is encoded
+    only when `save_flight_recording` is called, e.g. after a failed test.
+    """
+
+    def __init__(self, screenshot_module, screenshot_directory, fps, display_cursor, fps_cache_ttl=0, encoder=None,
+                 duration=30, save_on_failure=True, resize=None):
+        VideoClient.__init__(self, screenshot_module, screenshot_directory, fps, display_cursor, fps_cache_ttl,
+                             encoder, resize)
+        self.duration = timestr_to_secs(duration)
+        if self.duration <= 0:
+            raise ValueError('The duration of the flight recording must be greater than 0.')
+        self.save_on_failure = is_truthy(save_on_failure)
+        self.saved_for = None
+        self.ring = None
+
+    @property
+    def _capture_encoder(self):
+        return self.ring
+
+    def start_flight_recording(self, alias, name, size_percentage, embed, embed_width, monitor):
+        self.queue_size, self.overflow_policy = norm_pipeline_options(16, 'block')
+        if not self.fps:
+            self.fps = self.measure_fps(size_percentage, monitor)
+        self.alias = alias
+        self.name = name
+        self.embed = embed
+        self.embed_width = embed_width
+        self.ring = FrameRing(max(int(self.duration * self.fps), 1))
+        converter, ring = self._open_writer(None, self.fps, size_percentage, int(monitor))
+        self.futures = self.capture_screen(ring, converter, self.fps, int(monitor))
+
+    def save_flight_recording(self, save_to_disk=True, embed=None):
+        """Encodes the frames in memory into a video and returns its path."""
+        frames = self.ring.frames()
+        if not frames:
+            raise RuntimeError('The flight recording has no frames yet.')
+        self.path = self._save_screenshot_path(basename=self.name, format=self.encoder.extension)
+        vid = self.encoder.open(self.path, self.ring.fps, self.ring.size)
+        try:
+            for data, repeat in frames:
+                frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+                for _ in range(repeat):
+                    vid.write(frame)
+        finally:
+            vid.release()
+        self.statistics.add_files([self.path])
+        if is_truthy(self.embed if embed is None else embed):
+            self._embed_video(self.path, self.embed_width, save_to_disk)
+        return self.path
+
+    def stop_flight_recording(self):
+        self._stop_thread()
+        self.ring.clear()
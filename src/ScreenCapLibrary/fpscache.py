@@ -0,0 +1,94 @@
+#  Copyright 2008-2015 Nokia Networks
+#  Copyright 2016-     Robot Framework Foundation
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+_replace = getattr(os, 'replace', os.rename)
+
+FPS_CACHE_ENV = 'SCREENCAPLIBRARY_FPS_CACHE'
+
+
+class FpsCache(object):
+    """Stores frame rates measured by the recording benchmark on disk.
+
+    Measuring takes two seconds, so the result is reused by every following
+    recording, also from other processes, until it is older than the TTL.
+    Entries are keyed by everything that affects the measurement: capture
+    backend, monitor geometry, ``size_percentage``, ``display_cursor``, the
+    video encoder and the resize policy. Unless a ``path`` is given, the
+    cache is stored where the environment variable
+    ``SCREENCAPLIBRARY_FPS_CACHE`` points to or in the temporary directory.
+    """
+
+    def __init__(self, path=None):
+        self._path = path
+        self._lock = threading.Lock()
+
+    @property
+    def path(self):
+        # Read on every use so that the variable can be changed after the library is imported.
+        return (self._path or os.environ.get(FPS_CACHE_ENV)
+                or os.path.join(tempfile.gettempdir(), 'ScreenCapLibrary', 'fps_cache.json'))
+
+    @staticmethod
+    def key(backend, geometry, size_percentage, display_cursor, encoder='vp8', resize='auto'):
+        return '%s|%s|%s|%s|%s|%s' % (backend, 'x'.join(str(int(value)) for value in geometry),
+                                      float(size_percentage), bool(display_cursor), encoder, resize)
+
+    def get(self, key, ttl):
+        if ttl <= 0:
+            return None
+        with self._lock:
+            entry = self._read().get(key)
+        if not entry or time.time() - entry['time'] > ttl:
+            return None
+        return entry['fps']
+
+    def set(self, key, fps):
+        with self._lock:
+            entries = self._read()
+            entries[key] = {'fps': fps, 'time': time.time()}
+            self._write(entries)
+
+    def _read(self):
+        try:
+            with open(self.path) as cache_file:
+                entries = json.load(cache_file)
+        except (IOError, OSError, ValueError):
+            return {}
+        return entries if isinstance(entries, dict) else {}
+
+    def _write(self, entries):
+        directory = os.path.dirname(self.path)
+        try:
+            if not os.path.isdir(directory):
+                try:
+                    os.makedirs(directory)
+                except OSError:
+                    pass  # created meanwhile by another process
+            # Written to a temporary file first so parallel processes never read half a file.
+            fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'w') as cache_file:
+                json.dump(entries, cache_file)
+            _replace(temp_path, self.path)
+        except (IOError, OSError):
+            pass
+
+
+fps_cache = FpsCache()
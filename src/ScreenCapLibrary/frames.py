@@ -0,0 +1,183 @@
+#  Copyright 2008-2015 Nokia Networks
+#  Copyright 2016-     Robot Framework Foundation
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import threading
+
+from .utils import cv2, np
+
+
+def mss_to_numpy(sct_img):
+    """Returns the BGRA pixels of an ``mss`` screenshot without copying them."""
+    return np.frombuffer(sct_img.raw, dtype=np.uint8).reshape((sct_img.height, sct_img.width, 4))
+
+
+class ChangeDetector(object):
+    """Tells whether a grabbed frame differs from the previous one.
+
+    The grabbed pixels are compared as a whole. Comparing only a sample of
+    them would be cheaper but could miss small changes like a typed
+    character. They are compared a block of rows at a time into a reused
+    buffer, so nothing is allocated per frame and the comparison stops at the
+    first block that differs. ``extra`` covers what is drawn over the frame,
+    like the cursor position. The pixels may be cropped views of a shared grab.
+    """
+    _block_bytes = 256 * 1024
+
+    def __init__(self):
+        self.unchanged = 0
+        self._previous = None
+        self._previous_extra = None
+        self._equal = None
+
+    def changed(self, pixels, extra=None):
+        changed = self._previous is None or extra != self._previous_extra or not self._same(pixels, self._previous)
+        self._previous = pixels
+        self._previous_extra = extra
+        if not changed:
+            self.unchanged += 1
+        return changed
+
+    def _same(self, pixels, previous):
+        if pixels.shape != previous.shape:
+            return False
+        if pixels.ndim == 3 and pixels.shape[2] == 4:
+            # Comparing whole pixels instead of single bytes is about twice as fast.
+            pixels, previous = pixels.view(np.uint32), previous.view(np.uint32)
+        rows = max(1, self._block_bytes // max(1, pixels[:1].nbytes))
+        equal = self._equal_buffer((min(rows, len(pixels)),) + pixels.shape[1:])
+        for start in range(0, len(pixels), rows):
+            block = pixels[start:start + rows]
+            out = equal[:len(block)]
+            np.equal(block, previous[start:start + rows], out=out)
+            if not out.all():
+                return False
+        return True
+
+    def _equal_buffer(self, shape):
+        if self._equal is None or self._equal.shape != shape:
+            self._equal = np.empty(shape, dtype=bool)
+        return self._equal
+
+
+AUTO = 'auto'
+RESIZE_POLICIES = (AUTO, 'area', 'pyramid', 'linear', 'nearest')
+
+
+def norm_resize_policy(resize):
+    resize = (resize or AUTO).lower()
+    if resize not in RESIZE_POLICIES:
+        raise ValueError("Invalid resize policy '%s'. Possible values are %s."
+                         % (resize, ', '.join(RESIZE_POLICIES)))
+    return resize
+
+
+def resize_steps(source_size, size, resize=AUTO):
+    """Returns the ``(size, interpolation)`` steps that scale ``source_size`` down to ``size``.
+
+    ``area`` averages all source pixels of each frame pixel in one step.
+    ``pyramid`` halves the image with ``area`` as long as the result is at
+    least ``size`` and scales the rest in one more step, which is far
+    cheaper because OpenCV halves images with a vectorized fast path. For
+    power-of-two factors the result differs from ``area`` only by rounding,
+    so ``auto`` uses ``pyramid`` for them and ``area`` otherwise. ``linear``
+    and ``nearest`` take one fast step that skips source pixels when scaling
+    below half, so thin lines and text may flicker.
+    """
+    if resize == 'linear':
+        return [(size, cv2.INTER_LINEAR)]
+    if resize == 'nearest':
+        return [(size, cv2.INTER_NEAREST)]
+    steps = []
+    if resize in (AUTO, 'pyramid'):
+        width, height = source_size
+        while width // 2 >= size[0] and height // 2 >= size[1]:
+            width, height = width // 2, height // 2
+            steps.append(((width, height), cv2.INTER_AREA))
+        if resize == AUTO and (width, height) != size:
+            steps = []
+    if not steps or steps[-1][0] != size:
+        steps.append((size, cv2.INTER_AREA))
+    return steps
+
+
+class FrameConverter(object):
+    """Resizes and color converts grabbed frames into reusable buffers.
+
+    The intermediate resized images are kept between frames, and so is the
+    output frame unless the caller provides its own one, e.g. from a
+    `FramePool`. Once the buffers exist no memory is allocated per frame.
+    ``resize`` is the policy frames are scaled down with, see `resize_steps`.
+    """
+
+    def __init__(self, width, height, size_percentage, conversion, resize=AUTO):
+        self.size = (int(width * size_percentage), int(height * size_percentage))
+        self.shape = (self.size[1], self.size[0], 3)
+        self.conversion = conversion
+        self.resize = norm_resize_policy(resize)
+        self._source_size = None
+        self._steps = []
+        self._resized = []
+        self._frame = None
+
+    def convert(self, source, frame=None):
+        source_size = (source.shape[1], source.shape[0])
+        if source_size != self._source_size:
+            self._source_size = source_size
+            self._steps = resize_steps(source_size, self.size, self.resize) if source_size != self.size else []
+            self._resized = [None] * len(self._steps)
+        for index, (size, interpolation) in enumerate(self._steps):
+            self._resized[index] = cv2.resize(source, size, dst=self._resized[index], interpolation=interpolation)
+            source = self._resized[index]
+        if frame is None:
+            if self._frame is None:
+                self._frame = np.empty(self.shape, dtype=np.uint8)
+            frame = self._frame
+        return cv2.cvtColor(source, self.conversion, dst=frame)
+
+
+class FramePool(object):
+    """Recycles frame buffers handed from the capture to the encoding stage.
+
+    At most ``limit`` buffers are created. When all of them are in use,
+    ``acquire`` waits until the encoder releases one, unless the pool has
+    been closed because the encoder is gone.
+    """
+
+    def __init__(self, shape, limit):
+        self.shape = shape
+        self.limit = limit
+        self.created = 0
+        self._free = []
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while not self._free:
+                if self.created < self.limit or self._closed:
+                    self.created += 1
+                    return np.empty(self.shape, dtype=np.uint8)
+                self._condition.wait()
+            return self._free.pop()
+
+    def release(self, frame):
+        with self._condition:
+            self._free.append(frame)
+            self._condition.notify()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
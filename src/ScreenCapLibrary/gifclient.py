@@ -1,38 +1,63 @@
-import imageio
 import threading
 
 from .client import Client, run_in_background
-from .pygtk import _take_gtk_screen_size, _grab_gtk_pb, _convert_pixbuf_to_numpy, is_gdk
-from .utils import _norm_path, resize_array, is_pygtk
-from mss import mss
-from PIL import Image, ImageSequence
+from .cursor import cursor_overlay
+from .frames import ChangeDetector, FrameConverter, norm_resize_policy
+from .processencoder import ProcessEncoder
+from .stats import RecordingStatistics
+from .utils import LazyModule, _norm_path, cv2, monotonic
 from robot.utils import is_truthy
 
-try:
-    import cv2
-    import numpy as np
-except ImportError:
-    raise ImportError('Importing cv2 failed. Make sure you have opencv-python installed.')
+imageio = LazyModule('imageio')
+Image = LazyModule('PIL.Image')
+ImageSequence = LazyModule('PIL.ImageSequence')
 
 
+class GifEncoder(object):
+    """Writes GIFs with ``imageio`` through the same interface as the video encoders."""
+
+    extension = 'gif'
+
+    def open(self, path, fps, size):
+        return GifWriter(imageio.get_writer(path, mode='I'))
+
+
+class GifWriter(object):
+
+    def __init__(self, writer):
+        self._writer = writer
+
+    def write(self, frame):
+        self._writer.append_data(frame)
+
+    def release(self):
+        self._writer.close()
+
 
 class GifClient(Client):
 
-    def __init__(self, screenshot_module, screenshot_directory):
+    def __init__(self, screenshot_module, screenshot_directory, display_cursor=False):
         Client.__init__(self)
         self.screenshot_module = screenshot_module
         self._given_screenshot_dir = _norm_path(screenshot_directory)
+        self.display_cursor = is_truthy(display_cursor)
         self.optimize = None
+        self.alias = None
+        self.encoder = GifEncoder()
+        self.resize = None
+        self.statistics = RecordingStatistics()
 
     def start_gif_recording(self, name, size_percentage,
-                            embed, embed_width, monitor, optimize):
+                            embed, embed_width, monitor, optimize, encode_in_process=False, resize=None):
+        self.resize = norm_resize_policy(resize)
+        if is_truthy(encode_in_process):
+            self.encoder = ProcessEncoder(self.encoder)
         self.name = name
         self.embed = embed
         self.embed_width = embed_width
         self.optimize = optimize
         self.path = self._save_screenshot_path(basename=self.name, format='gif')
         self.futures = self.grab_frames(size_percentage, self._stop_condition, int(monitor))
-        self.clear_thread_queues()
 
     def stop_gif_recording(self, save_to_disk):
         self._stop_thread()
@@ -42,40 +67,50 @@ class GifClient(Client):
                 frame = frame.copy()
                 frames.append(frame)
             frames[0].save(self.path, save_all=True, append_images=frames[1:], optimize=True)
+        self.statistics.add_files([self.path])
         if is_truthy(self.embed):
             self._embed_screenshot(self.path, self.embed_width, save_to_disk)
         return self.path
 
     @run_in_background
     def grab_frames(self, size_percentage, stop, monitor):
-        if is_pygtk(self.screenshot_module):
-            self._grab_frames_gtk(size_percentage, stop, monitor)
-        else:
-            self._grab_frames_mss(size_percentage, stop, monitor)
+        self._start = self._last_frame = monotonic()
+        try:
+            self._grab_frames(size_percentage, stop, monitor)
+        finally:
+            # Writing the GIF when it is closed does not count towards the frame rate.
+            elapsed = self._last_frame - self._start
+            self.statistics.achieved_fps = self.statistics.captured / elapsed if elapsed else 0.0
 
-    def _grab_frames_gtk(self, size_percentage, stop, monitor):
-        w, h = _take_gtk_screen_size(monitor)
+    def _grab_frames(self, size_percentage, stop, monitor):
+        w, h = self.backend.size(monitor)
         width = int(w * size_percentage)
         height = int(h * size_percentage)
-        with imageio.get_writer(self.path, mode='I') as writer:
-            while not stop.isSet():
-                pb = _grab_gtk_pb(monitor)
-                if is_gdk():
-                    numpy_array = _convert_pixbuf_to_numpy(pb)
-                else:
-                    numpy_array = pb.get_pixels_array()
-                resized_array = resize_array(width, height, numpy_array, size_percentage)
-                frame = cv2.cvtColor(resized_array, cv2.COLOR_RGBA2RGB)
-                writer.append_data(frame)
-
-    def _grab_frames_mss(self, size_percentage, stop, monitor):
-        with mss() as sct:
-            mon = sct.monitors[monitor]
-            width = int(sct.grab(mon).width * size_percentage)
-            height = int(sct.grab(mon).height * size_percentage)
-            with imageio.get_writer(self.path, mode='I') as writer:
-                while not stop.isSet():
-                    sct_img = sct.grab(mon)
-                    resized_array = resize_array(width, height, np.array(sct_img), size_percentage)
-                    frame = cv2.cvtColor(resized_array, cv2.COLOR_RGB2BGR)
-                    writer.append_data(frame)
+        converter = FrameConverter(width, height, size_percentage, cv2.COLOR_RGB2BGR, self.resize)
+        detector = ChangeDetector()
+        # GIFs are grabbed as fast as possible, so they do not limit how old a shared grab may be.
+        subscription = self.backend.hub.subscribe(monitor)
+        try:
+            writer = self.encoder.open(self.path, None, converter.size)
+            try:
+                with cursor_overlay(self.display_cursor, self.backend, monitor, converter.size, rgb=True) as cursor:
+                    while not stop.isSet():
+                        grab_start = monotonic()
+                        pixels = self.backend.hub.grab(subscription, monitor)
+                        position = cursor.position if cursor else None
+                        if detector.changed(pixels, position):
+                            frame = converter.convert(pixels)
+                            if cursor:
+                                cursor.draw(frame, position)
+                        self._write_frame(writer, frame, grab_start)
+            finally:
+                writer.release()
+        finally:
+            self.backend.hub.unsubscribe(subscription)
+
+    def _write_frame(self, writer, frame, grab_start):
+        encode_start = monotonic()
+        writer.write(frame)
+        self._last_frame = monotonic()
+        self.statistics.add_grab(encode_start - grab_start)
+        self.statistics.add_encode(self._last_frame - encode_start)
@@ -13,13 +13,24 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
+import atexit
+
 from .version import VERSION
+from .backends import close_backends
 from .client import Client
+from .executor import background_executor
+from .flightrecorder import FlightRecorder
+from .paths import path_allocator
 from .videoclient import VideoClient
 from .gifclient import GifClient
 
 __version__ = VERSION
 
+# The keys of the statistics of GIF recordings and of flight recordings started without an alias,
+# which no alias given to a keyword can match.
+_GIF_STATISTICS = object()
+_FLIGHT_STATISTICS = object()
+
 
 class ScreenCapLibrary:
     """ Test Library for taking screenshots on the machine where tests are run.
@@ -42,9 +53,12 @@ class ScreenCapLibrary:
 
     - [http://pygtk.org/ | PyGTK] is an alternative to ``mss`` for taking screenshots when using VNC.
 
+    - ``xshm`` grabs X11 displays, for example Xvfb, through the MIT-SHM extension with the lowest latency.
+
 
     For video recording, [https://github.com/skvark/opencv-python/blob/master/README.md | OpenCV-Python] is used and
-    the output file is in WebM format.
+    the output file is in WebM format by default. See the ``encoder`` argument of `Start Video Recording`
+    for faster alternatives.
 
     = Where screenshots are saved =
 
@@ -91,13 +105,18 @@ class ScreenCapLibrary:
 
     started_recordings = []
     started_gifs = []
+    started_flight_recordings = []
+    recorded_statistics = []
 
     def __init__(self, screenshot_module=None, screenshot_directory=None, format='png', quality=50, delay=0,
-                 display_cursor=False):
+                 display_cursor=False, fps_cache_ttl='1 day', background_workers=None):
         """
         ``screenshot_module`` specifies the module or tool to use when taking screenshots using this library.
         If no tool or module is specified, ``mss`` will be used by default. For running
-        on Linux with VNC, use ``PyGTK``.
+        on Linux with VNC, use ``PyGTK``. On Linux ``xshm`` grabs the X11 display through
+        shared memory, which is the fastest option for recordings under Xvfb. It requires the
+        MIT-SHM extension and the X11 client libraries. The module is used for both screenshots
+        and recordings.
 
         To configure where screenshots are saved use ``screenshot_directory``. If no value is given,
         screenshots are saved into same directory as the log file. The directory can also be set using
@@ -117,11 +136,27 @@ class ScreenCapLibrary:
 
         ``display_cursor`` displays a cursor which copies the mouse
         movements in order to perform an enhanced visualization of mouse
-        position. By default ``display_cursor`` is set to False. See
-        `Boolean arguments` section for more details.
+        position in video, GIF and flight recordings. The pointer position
+        is sampled on a background thread about 60 times per second, so
+        drawing the cursor hardly slows down the recording. By default
+        ``display_cursor`` is set to False. See `Boolean arguments` section
+        for more details.
 
         ``display_cursor`` is new in ScreenCapLibrary 1.5.0.
 
+        ``fps_cache_ttl`` specifies for how long the frame rate measured when `Start Video Recording`
+        is used without ``fps`` is reused by later recordings, also in other processes. See `Time format`
+        section for more information. By default the result is reused for 1 day. Use 0 to measure
+        it every time. `Measure Recording Performance` can be used to measure it again. The results are
+        stored in the temporary directory unless the ``SCREENCAPLIBRARY_FPS_CACHE`` environment variable
+        points to another file.
+
+        ``background_workers`` is the number of threads shared by all recordings and other background
+        work. Every video recording uses two of them, GIF recordings and `Take Multiple Screenshots`
+        use one and save screenshots on the remaining ones. If all are busy, starting a new recording
+        waits for up to 10 seconds and then fails. The default is 16. The threads are shared by all imports
+        of the library, so only the first import that gives ``background_workers`` sets it.
+
         Examples (use only one of these):
         | =Setting= |  =Value=   |  =Value=                        |
         | Library   | Screenshot |                                 |
@@ -137,8 +172,12 @@ class ScreenCapLibrary:
             format=format,
             quality=quality,
             delay=delay,
-            display_cursor=display_cursor
+            display_cursor=display_cursor,
+            fps_cache_ttl=fps_cache_ttl
         )
+        if background_workers is not None:
+            background_executor.configure(background_workers)
+        self.ROBOT_LIBRARY_LISTENER = [_BackgroundWorkListener(self.client), _FlightRecorderListener()]
 
     def set_screenshot_directory(self, path):
         """Sets the directory where screenshots are saved.
@@ -151,7 +190,7 @@ class ScreenCapLibrary:
         return self.client.set_screenshot_directory(path)
 
     def take_screenshot(self, name='screenshot', format=None, quality=None, width='800px', delay=0,
-                        monitor=1, save_to_disk=True):
+                        monitor=1, save_to_disk=True, wait=True):
         """Takes a screenshot in the specified format at library import and
         embeds it into the log file (PNG by default).
 
@@ -182,6 +221,12 @@ class ScreenCapLibrary:
 
         ``save_to_disk`` specifies whether the image will be saved on the disk or only be available in the log file
 
+        ``wait`` specifies whether the keyword waits until the screenshot is saved. If set to ``False``,
+        only the screen is captured before the keyword returns and the screenshot is saved in the
+        background. Screenshots that are not saved to disk are then embedded into the log file by
+        `Wait For Pending Screenshots`, which is also run automatically at the end of each test and suite.
+        See `Boolean arguments` section for more details.
+
         Examples: (LOGDIR is determined automatically by the library)
         | `Take Screenshot` |                  |            | # LOGDIR/screenshot_1.png (index automatically incremented) |
         | `Take Screenshot` | mypic            |            | # LOGDIR/mypic_1.png (index automatically incremented) |
@@ -190,13 +235,26 @@ class ScreenCapLibrary:
         | `Take Screenshot` | images/login.jpg | 300px      | # Specify both name and width. |
         | `Take Screenshot` | width=550px      |            | # Specify only width. |
         | `Take Screenshot` | format=jpg       | quality=15 | # Specify both image format and quality |
+        | `Take Screenshot` | wait=False       |            | # Save the screenshot in the background |
 
         The path where the screenshot is saved is returned.
         """
-        return self.client.take_screenshot(name, format, quality, width, delay, monitor, save_to_disk)
+        return self.client.take_screenshot(name, format, quality, width, delay, monitor, save_to_disk, wait)
+
+    def wait_for_pending_screenshots(self):
+        """Waits until all screenshots taken by `Take Screenshot` with ``wait=False`` are saved.
+
+        Screenshots that are not saved to disk are embedded into the log file by this keyword.
+        It is run automatically at the end of each test and suite. If some screenshots fail, the
+        others are still saved and embedded before the first error is reported.
+
+        The paths of the screenshots are returned.
+        """
+        return self.client.wait_for_pending_screenshots()
 
     def start_gif_recording(self, name="screenshot", size_percentage=0.5,
-                            embed=True, embed_width='800px', monitor=1, optimize=True):
+                            embed=True, embed_width='800px', monitor=1, optimize=True, encode_in_process=False,
+                            resize='auto'):
         """
         Starts the recording of a GIF in the background with the specified ``name``.
         The recording can be stopped by calling the `Stop Gif Recording` keyword.
@@ -208,6 +266,8 @@ class ScreenCapLibrary:
         screen resolution. By default this parameter is set to resize the images to
         0.5 of the screen resolution.
 
+        ``resize`` selects how the screen captures are scaled down, like in `Start Video Recording`.
+
         ``embed`` specifies if the screenshot should be embedded in the log file
         or not. See `Boolean arguments` section for more details.
 
@@ -218,6 +278,8 @@ class ScreenCapLibrary:
 
         ``optimize`` drastically reduces the size (and quality) of the gif file.
 
+        ``encode_in_process`` writes the GIF in a separate process, like with `Start Video Recording`.
+
         Examples:
         | `Start Gif Recording` |            |  # Starts the GIF recording in background |
         | `Sleep`               | 10 seconds |  # Here should be the actions that will be recorded |
@@ -226,9 +288,11 @@ class ScreenCapLibrary:
         """
         if len(self.started_gifs) > 0:
             raise Exception('A gif recording is already in progress!')
-        gif_client = GifClient(self.client.screenshot_module, self.client.screenshot_dir)
+        gif_client = GifClient(self.client.screenshot_module, self.client.screenshot_dir, self.client.cursor)
+        gif_client.start_gif_recording(name, size_percentage, embed, embed_width, monitor, optimize,
+                                       encode_in_process, resize)
         self.started_gifs.append(gif_client)
-        gif_client.start_gif_recording(name, size_percentage, embed, embed_width, monitor, optimize)
+        self._register_statistics(_GIF_STATISTICS, gif_client.statistics)
 
     def stop_gif_recording(self, save_to_disk=True):
         """
@@ -294,24 +358,41 @@ class ScreenCapLibrary:
         ``delay_time`` specifies the waiting time before taking another
         screenshot. See `Time format` section for more information. By
         default the delay time is 0.
+
+        The screenshots are taken in the background and each one is saved
+        while the next ones are being taken. The paths where the screenshots
+        will be saved are returned.
         """
         return self.client.take_multiple_screenshots(name, format, quality, screenshot_number, delay_time, monitor)
 
-    def start_video_recording(self, alias=None, name="recording", fps=None, size_percentage=1, embed=True, embed_width='800px', monitor=1):
+    def start_video_recording(self, alias=None, name="recording", fps=None, size_percentage=1, embed=True, embed_width='800px', monitor=1,
+                              queue_size=16, overflow_policy='block', encoder='vp8', segment_length=None,
+                              segment_size=None, max_segments=None, encode_in_process=False, resize='auto'):
         """Starts the recording of a video in the background with the specified ``name``.
         The recording can be stopped by calling the `Stop Video Recording` keyword.
 
-        ``alias`` helps identify the recording, if you want to close a specific one.
+        ``alias`` helps identify the recording, if you want to close a specific one. Several recordings, including
+        GIF and flight recordings, can run at the same time. They share the screen grabs of their module, so
+        recording the same monitor twice does not grab it twice as often.
 
         ``name`` specifies the name by which the record will be saved.
 
         ``fps`` specifies the frame rate at which the video is displayed. If is set to ``None`` it will be
-        automatically computed based on the performance of the system.
+        automatically computed based on the performance of the system. The computed value is reused for
+        later recordings with the same monitor and settings, see ``fps_cache_ttl`` in `importing`.
 
         ``size_percentage`` is used to reduce the size of the screen recordings. It will specify
         how much this reduction is with respect to screen resolution. By default this parameter
         is set to full screen resolution i.e. 1.
 
+        ``resize`` selects how the frames are scaled down to ``size_percentage``. Possible values are:
+        | =Policy= | =Description= |
+        | auto     | Default. The quality of ``area``, using ``pyramid`` where it gives the same result. |
+        | area     | Averages all screen pixels of each frame pixel. Best quality, but slow unless the size is halved. |
+        | pyramid  | Halves the frames until ``size_percentage`` is reached and scales the rest with ``area``. Exact and several times faster for 0.5, 0.25, 0.125 and so on, close to ``area`` otherwise. |
+        | linear   | Fast. Thin lines and text may flicker below 0.5. |
+        | nearest  | Fastest, with the lowest quality. |
+
         ``embed`` specifies if the record should be embedded in the log file
         or not. See `Boolean arguments` section for more details.
 
@@ -320,45 +401,152 @@ class ScreenCapLibrary:
 
         ``monitor`` selects which monitor you want to capture. Use value 0 to capture all.
 
+        ``queue_size`` is the number of captured frames that can wait for the encoder. Frames are
+        captured and encoded in separate threads, so a slow encoder does not stop the capturing.
+
+        ``overflow_policy`` specifies what happens when the queue is full. Possible values are
+        ``block`` (wait for the encoder, default), ``drop_oldest`` and ``drop_newest``. The number of
+        dropped frames is logged by `Stop Video Recording`.
+
+        ``encoder`` selects how the video is encoded, which also decides the file format:
+        | =Encoder= | =Alias=    | =File= | =Description=                                          |
+        | vp8       | small      | .webm  | Default. Small files that browsers can play, but slow. |
+        | mp4v      | fast       | .mp4   | MPEG-4 Part 2, several times faster than VP8.          |
+        | mjpg      |            | .avi   | Motion JPEG, every frame compressed on its own.        |
+        | ffv1      | lossless   | .mkv   | Lossless, for pixel exact recordings.                  |
+        | raw       |            | .avi   | Uncompressed, fastest but with huge files.             |
+        | ffmpeg-h264 |          | .mp4   | H.264 encoded by ffmpeg on all cores. Browsers can play it. |
+        | ffmpeg-vp8  |          | .webm  | VP8 encoded by ffmpeg on all cores.                    |
+        Either the encoder or its alias can be used. An alias only selects the encoder, it does not
+        change its settings. Browsers can only play the embedded
+        video of the ``vp8``, ``ffmpeg-h264`` and ``ffmpeg-vp8`` encoders. Which encoders are
+        available depends on the installed OpenCV. The ``ffmpeg`` encoders pipe the frames to a
+        separate [https://ffmpeg.org|ffmpeg] process, which must be found from ``PATH`` or from the
+        ``SCREENCAPLIBRARY_FFMPEG`` environment variable. They suit long recordings at high resolutions.
+
+        ``segment_length`` and ``segment_size`` split long recordings into several video files. A new file,
+        called a segment, is started once the current one contains ``segment_length`` of video (see
+        `Time format`) or has grown to about ``segment_size``, e.g. ``50 MB``. Finished segments are closed right
+        away, so they can be used even if the test run is killed. The segments are listed in a JSON
+        manifest, whose path `Stop Video Recording` returns instead of the path of the video. It contains
+        the file name, start time, duration and size of each segment. ``max_segments`` keeps only the given
+        number of newest segments, older ones are deleted.
+
+        ``encode_in_process`` encodes the video in a separate process. The frames are handed over through
+        shared memory, so the test and other recordings do not wait for the encoder to release the GIL. This
+        helps when several recordings run at the same time. Requires Python 3.8 or newer.
+
         Examples:
         | `Start Video Recording` |            |  # Starts the video recording in background |
         | `Sleep`                 | 10 seconds |  # Here should be the actions that will be recorded |
         | `Stop Video Recording`  |            |  # Will create the video containing the screen recording \
         since `Start Video Recording` was called. |
 
+        | `Start Video Recording` | segment_length=5 minutes | max_segments=3 |  # Keeps the last 10 to 15 minutes of the video |
+
         *Note:* Be aware that during recording the number of the collected frames are dependent on the
-        performance of your system. Check different values for ``fps`` to find optimal results. (e.g.
-        for a 15 seconds recording the output might be a 2 second video with 30 fps).
+        performance of your system. Frames are captured at fixed points in time, and when the system cannot
+        keep up with ``fps`` the previous frame is repeated, so the video still lasts as long as the
+        recording did. `Stop Video Recording` logs the frame rate that was actually achieved. Check different
+        values for ``fps`` to find optimal results.
         """
         if size_percentage <= 0 or size_percentage > 1:
             raise Exception('Size percentage should take values > than 0 and <= to 1.')
-        video_client = VideoClient(self.client.screenshot_module, self.client.screenshot_dir, fps, self.client.cursor)
+        video_client = VideoClient(self.client.screenshot_module, self.client.screenshot_dir, fps, self.client.cursor,
+                                   self.client.fps_cache_ttl, encoder, resize)
+        video_client.start_video_recording(alias, name, size_percentage, embed, embed_width, monitor,
+                                           queue_size, overflow_policy, segment_length, segment_size, max_segments,
+                                           encode_in_process)
         self.started_recordings.append(video_client)
-        video_client.start_video_recording(alias, name, size_percentage, embed, embed_width, monitor)
+        self._register_statistics(alias, video_client.statistics)
+
+    def measure_recording_performance(self, size_percentage=1, monitor=1, encoder='vp8', resize='auto'):
+        """Measures the frame rate at which videos can be recorded on this system and returns it.
+
+        The measurement takes 2 seconds. Its result replaces the cached value that
+        `Start Video Recording` uses when no ``fps`` is given, so this keyword can be used to
+        force a new measurement e.g. after the load of the system has changed.
+
+        ``size_percentage``, ``monitor``, ``encoder`` and ``resize`` have the same meaning as in
+        `Start Video Recording`.
+        """
+        video_client = VideoClient(self.client.screenshot_module, self.client.screenshot_dir, None, self.client.cursor,
+                                   self.client.fps_cache_ttl, encoder, resize)
+        return video_client.measure_fps(size_percentage, monitor, force=True)
+
+    def get_recording_statistics(self, alias=None):
+        """Returns what the video, GIF or flight recording with the given ``alias`` achieved.
+
+        If no ``alias`` is given, the statistics of the last started recording are returned. The
+        recording may still be running, but the values are final only once it has been stopped.
+        GIF recordings have no alias, so their statistics are returned when a GIF was started last.
+
+        The statistics are returned as a dictionary with the following items:
+        | =Key=                 | =Description=                                                        |
+        | captured_frames       | Number of frames grabbed from the screen.                            |
+        | encoded_frames        | Number of frames written to the file, including duplicated ones.     |
+        | dropped_frames        | Frames dropped because the encoder could not keep up.                |
+        | duplicated_frames     | Frames repeated because the capture could not keep up with ``fps``.  |
+        | achieved_fps          | Times per second the screen was grabbed while not paused.            |
+        | grab_latency_p50      | Median time in seconds to grab and convert a frame.                  |
+        | grab_latency_p95      | 95th percentile of the grab time in seconds.                         |
+        | grab_latency_max      | Longest grab time in seconds.                                        |
+        | encode_latency_p50    | Median time in seconds to encode a frame.                            |
+        | encode_latency_p95    | 95th percentile of the encoding time in seconds.                     |
+        | encode_latency_max    | Longest encoding time in seconds.                                    |
+        | bytes_written         | Size of the created file or segments.                                |
+        | peak_queue_depth      | Most frames that waited for the encoder at the same time.            |
+
+        A high ``grab_latency_p95`` compared to ``1 / fps`` means ``fps`` is too high for the screen
+        size, and a ``peak_queue_depth`` that reaches ``queue_size`` means the encoder is too slow. Lower
+        ``fps`` or ``size_percentage``, or choose a faster ``encoder``, in `Start Video Recording`.
 
-    def stop_all_video_recordings(self, save_to_disk=True):
-        """Stops all the video recordings and generates the files in WebM format. If ``embed`` argument
+        Examples:
+        | `Start Video Recording`    | alias=login |
+        | `Stop Video Recording`     | alias=login |
+        | ${stats}= | `Get Recording Statistics` | alias=login |
+        | `Should Be Equal As Integers` | ${stats}[dropped_frames] | 0 |
+        """
+        for recorded_alias, statistics in reversed(self.recorded_statistics):
+            if alias is None or recorded_alias == alias:
+                return statistics.as_dict()
+        if alias:
+            raise Exception('No recording with alias `%s` found!' % alias)
+        raise Exception('No recordings were started!')
+
+    def _register_statistics(self, alias, statistics):
+        # Only the last recording with each alias is kept, so that the statistics do not pile up.
+        # GIFs and flight recordings without an alias are kept apart from the videos without one.
+        self.recorded_statistics[:] = [item for item in self.recorded_statistics if item[0] != alias]
+        self.recorded_statistics.append((alias, statistics))
+
+    def stop_all_video_recordings(self, save_to_disk=True, log_statistics=False):
+        """Stops all the video recordings and generates the files. If ``embed`` argument
         was set to ``True`` the videos will be displayed in the log file.
 
+        ``log_statistics`` logs what each recording achieved, see `Get Recording Statistics`.
+
         The paths where the videos are saved are returned.
         """
         paths = []
         if len(self.started_recordings) == 0:
             raise Exception('No video recordings are started!')
         for recording in self.started_recordings:
-            recording.stop_video_recording(save_to_disk)
+            recording.stop_video_recording(save_to_disk, log_statistics)
             paths.append(recording.path)
         del self.started_recordings[:]
         return paths
 
-    def stop_video_recording(self, alias=None, save_to_disk=True):
-        """Stops the video recording corresponding to the given ``alias`` and generates the file in WebM format. If no
+    def stop_video_recording(self, alias=None, save_to_disk=True, log_statistics=False):
+        """Stops the video recording corresponding to the given ``alias`` and generates the file. If no
         ``alias`` is specified, the last opened recording will be closed. If there are more recordings with the same
         alias all of them will be closed. If ``embed`` argument was set to
         ``True`` the video will be displayed in the log file.
         Furthermore, if the ``save_to_disk`` parameter is set to ``False``, the video will be embedded and available in
         the log file only.
 
+        ``log_statistics`` logs what the recording achieved, see `Get Recording Statistics`.
+
         The path where the video is saved is returned.
         """
         if len(self.started_recordings) == 0:
@@ -373,11 +561,11 @@ class ScreenCapLibrary:
                 for recording in copy_list:
                     if recording.alias == alias:
                         self.started_recordings.remove(recording)
-                        recording.stop_video_recording(save_to_disk)
+                        recording.stop_video_recording(save_to_disk, log_statistics)
                         paths.append(recording.path)
                 return paths if len(paths) > 1 else paths[0]
             else:
-                return self.started_recordings.pop().stop_video_recording(save_to_disk)
+                return self.started_recordings.pop().stop_video_recording(save_to_disk, log_statistics)
         except RuntimeError as error:
             del self.started_recordings[:]
             raise error
@@ -421,3 +609,138 @@ class ScreenCapLibrary:
                 self.started_recordings[-1].resume_video_recording()
         except RuntimeError as error:
             raise error
+
+    def start_flight_recording(self, alias=None, name='flight_recording', duration='30 seconds', fps=10,
+                               size_percentage=1, embed=True, embed_width='800px', monitor=1, encoder='vp8',
+                               save_on_failure=True, resize='auto'):
+        """Starts recording the screen in the background, keeping only the last ``duration`` in memory.
+
+        Unlike `Start Video Recording`, nothing is encoded or written to disk while recording. The frames are
+        compressed as JPEG images and kept in memory, and older frames are discarded. A video of the last
+        ``duration`` is encoded only when `Save Flight Recording` is called or, if ``save_on_failure`` is
+        true, automatically whenever a test fails. The path of an automatically saved recording is added to
+        the message of the failed test. The recording continues until `Stop Flight Recording` is called, so
+        it can be started e.g. in a suite setup.
+
+        ``duration`` is the length of the video that is kept, see `Time format`. The memory used grows with
+        it, with ``fps`` and with the screen size.
+
+        ``fps`` is 10 by default. Use ``None`` to measure it like `Start Video Recording` does.
+
+        ``alias``, ``name``, ``size_percentage``, ``embed``, ``embed_width``, ``monitor``, ``encoder`` and
+        ``resize`` have the same meaning as in `Start Video Recording`. ``size_percentage`` and ``resize``
+        apply while recording, the others when the recording is saved.
+
+        Examples:
+        | `Start Flight Recording` | duration=1 minute |   |
+        | `Start Flight Recording` | alias=login       | encoder=fast |
+        """
+        if size_percentage <= 0 or size_percentage > 1:
+            raise Exception('Size percentage should take values > than 0 and <= to 1.')
+        recorder = FlightRecorder(self.client.screenshot_module, self.client.screenshot_dir, fps, self.client.cursor,
+                                  self.client.fps_cache_ttl, encoder, duration, save_on_failure, resize)
+        recorder.start_flight_recording(alias, name, size_percentage, embed, embed_width, monitor)
+        self.started_flight_recordings.append(recorder)
+        self._register_statistics(alias or _FLIGHT_STATISTICS, recorder.statistics)
+
+    def save_flight_recording(self, alias=None, save_to_disk=True):
+        """Encodes the last seconds kept by the flight recording with the given ``alias`` into a video.
+
+        If no ``alias`` is specified, the last started flight recording is saved. The recording continues
+        afterwards. ``save_to_disk`` has the same meaning as in `Stop Video Recording`.
+
+        The path where the video is saved is returned.
+        """
+        paths = [recorder.save_flight_recording(save_to_disk) for recorder in self._get_flight_recordings(alias)]
+        return paths if len(paths) > 1 else paths[0]
+
+    def stop_flight_recording(self, alias=None):
+        """Stops the flight recording with the given ``alias`` and discards the frames kept in memory.
+
+        If no ``alias`` is specified, the last started flight recording is stopped. Use
+        `Save Flight Recording` first to keep the video.
+        """
+        for recorder in self._get_flight_recordings(alias):
+            self.started_flight_recordings.remove(recorder)
+            recorder.stop_flight_recording()
+
+    def _get_flight_recordings(self, alias):
+        if len(self.started_flight_recordings) == 0:
+            raise Exception('No flight recordings are started!')
+        if not alias:
+            return [self.started_flight_recordings[-1]]
+        recorders = [recorder for recorder in self.started_flight_recordings if recorder.alias == alias]
+        if not recorders:
+            raise Exception('No flight recording with alias `%s` found!' % alias)
+        return recorders
+
+
+class _BackgroundWorkListener(object):
+    """Waits for the pending screenshots after every test and suite.
+
+    Once the top-level suite has ended, the recordings that were never
+    stopped are finished too, so that their files are complete before Robot
+    Framework writes the log. Exiting the process does the same otherwise.
+    """
+    ROBOT_LISTENER_API_VERSION = 2
+
+    def __init__(self, client):
+        self.client = client
+
+    def end_test(self, name, attributes):
+        self._finish()
+
+    def end_suite(self, name, attributes):
+        try:
+            self._finish()
+        finally:
+            if attributes['id'] == 's1':
+                _finish_background_work()
+
+    def _finish(self):
+        try:
+            self.client.wait_for_pending_screenshots()
+        finally:
+            # Tests often remove their screenshots, so the indices are looked up again.
+            path_allocator.reset()
+
+
+class _FlightRecorderListener(object):
+    """Saves the started flight recordings when a test fails.
+
+    Every import of the library has its own listener, and the recordings may
+    have been started through any of them, e.g. in a suite setup. Each
+    recording remembers the failed test it was saved for, so it is saved once.
+    """
+    ROBOT_LISTENER_API_VERSION = 3
+
+    def end_test(self, data, result):
+        if result.passed:
+            return
+        for recorder in ScreenCapLibrary.started_flight_recordings:
+            if not recorder.save_on_failure or recorder.saved_for is result:
+                continue
+            recorder.saved_for = result
+            # The test has ended, so the video cannot be embedded into its log anymore.
+            try:
+                message = "Flight recording saved to '%s'." % recorder.save_flight_recording(embed=False)
+            except Exception as error:
+                message = 'Saving the flight recording failed: %s' % error
+            result.message = '%s\n\n%s' % (result.message, message) if result.message else message
+
+
+def _finish_background_work():
+    # Recordings that were never stopped are finished so that their files are usable.
+    for recording in (ScreenCapLibrary.started_recordings + ScreenCapLibrary.started_gifs
+                      + ScreenCapLibrary.started_flight_recordings):
+        recording._stop_condition.set()
+    background_executor.drain(timeout=30)
+
+
+def _close_background_work():
+    _finish_background_work()
+    background_executor.shutdown(wait=True, timeout=30)
+    close_backends()
+
+
+atexit.register(_close_background_work)
@@ -0,0 +1,70 @@
+#  Copyright 2008-2015 Nokia Networks
+#  Copyright 2016-     Robot Framework Foundation
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import os
+import re
+import threading
+
+
+class PathAllocator(object):
+    """Hands out numbered paths like ``screenshot_3.png`` that are not in use.
+
+    The directory is listed once per basename and format, and the indices
+    found there and the ones handed out afterwards are kept in memory. Each
+    new path then costs a single existence check, which catches files created
+    by other processes, instead of one check per existing screenshot. Paths
+    are never handed out twice, even if their files are not written yet.
+
+    Files removed later are not noticed until `reset` is called, after which
+    the directories are listed again on the next allocation.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._indices = {}
+
+    def allocate(self, directory, basename, format):
+        # A basename like ``${TEMPDIR}/mypic`` is numbered in its own directory.
+        directory = os.path.join(directory, os.path.dirname(basename))
+        basename = os.path.basename(basename)
+        key = (os.path.normcase(directory), os.path.normcase(basename), os.path.normcase(format))
+        with self._lock:
+            entry = self._indices.get(key)
+            if entry is None:
+                entry = self._indices[key] = {'used': self._scan(*key), 'next': 1}
+            while True:
+                index = entry['next']
+                entry['next'] += 1
+                path = os.path.join(directory, '%s_%d.%s' % (basename, index, format))
+                if index not in entry['used'] and not os.path.exists(path):
+                    entry['used'].add(index)
+                    return path
+
+    def reset(self):
+        with self._lock:
+            self._indices.clear()
+
+    @staticmethod
+    def _scan(directory, basename, format):
+        pattern = re.compile(r'%s_(\d+)\.%s$' % (re.escape(basename), re.escape(format)))
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return set()
+        matches = (pattern.match(os.path.normcase(name)) for name in names)
+        return set(int(match.group(1)) for match in matches if match)
+
+
+path_allocator = PathAllocator()
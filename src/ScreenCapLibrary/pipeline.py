@@ -0,0 +1,183 @@
+#  Copyright 2008-2015 Nokia Networks
+#  Copyright 2016-     Robot Framework Foundation
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import threading
+
+from collections import deque
+
+from .executor import background_executor
+from .utils import monotonic
+
+DROP_OLDEST = 'drop_oldest'
+DROP_NEWEST = 'drop_newest'
+BLOCK = 'block'
+OVERFLOW_POLICIES = (DROP_OLDEST, DROP_NEWEST, BLOCK)
+
+
+def norm_pipeline_options(queue_size, overflow_policy):
+    try:
+        queue_size = int(queue_size)
+    except ValueError:
+        raise ValueError('The queue size argument must be of type integer.')
+    if queue_size < 1:
+        raise ValueError('The queue size must be greater than 0.')
+    overflow_policy = (overflow_policy or BLOCK).lower().replace(' ', '_')
+    if overflow_policy not in OVERFLOW_POLICIES:
+        raise ValueError("Invalid overflow policy '%s'. Possible values are %s."
+                         % (overflow_policy, ', '.join(OVERFLOW_POLICIES)))
+    return queue_size, overflow_policy
+
+
+class FrameQueue(object):
+    """Bounded frame queue shared by a capture and an encoding stage.
+
+    When the queue is full ``drop_oldest`` discards the oldest queued frame,
+    ``drop_newest`` discards the frame being added and ``block`` makes the
+    producer wait until the consumer has made room.
+    """
+
+    def __init__(self, maxsize=16, policy=BLOCK, on_drop=None):
+        self.maxsize, self.policy = norm_pipeline_options(maxsize, policy)
+        self.on_drop = on_drop
+        self.dropped = 0
+        self.peak = 0
+        self._frames = deque()
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def __len__(self):
+        with self._condition:
+            return len(self._frames)
+
+    def put(self, frame, repeat=1):
+        with self._condition:
+            if len(self._frames) >= self.maxsize:
+                if self.policy == DROP_NEWEST:
+                    self._drop(frame, repeat)
+                    return
+                if self.policy == DROP_OLDEST:
+                    self._drop(*self._frames.popleft())
+                else:
+                    while len(self._frames) >= self.maxsize and not self._closed:
+                        self._condition.wait()
+            self._frames.append((frame, repeat))
+            self.peak = max(self.peak, len(self._frames))
+            self._condition.notify_all()
+
+    def _drop(self, frame, repeat):
+        self.dropped += repeat
+        if self.on_drop:
+            self.on_drop(frame)
+
+    def get(self):
+        """Returns the next ``(frame, repeat)`` pair or ``None`` once closed and drained."""
+        with self._condition:
+            while not self._frames and not self._closed:
+                self._condition.wait()
+            if not self._frames:
+                return None
+            frame = self._frames.popleft()
+            self._condition.notify_all()
+            return frame
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+
+class EncodingPipeline(object):
+    """Feeds frames to ``writer`` from a separate encoder thread.
+
+    The encoder runs on a worker of the shared `BackgroundExecutor`.
+
+    ``write`` accepts the number of times the frame is repeated in the video,
+    so a frame is queued only once however many times it is written. Writers
+    that have a ``write_repeated`` method get the frame and the count once.
+    Writing ``None`` repeats the previous frame, which is kept until the next
+    one has been written, and writers that have a ``repeat`` method are asked
+    to repeat it themselves. Frames taken from ``pool`` are given back to it
+    once they have been replaced by the next frame or dropped. Encoder
+    errors are raised back to the capture thread on the next ``write`` or on
+    ``close``. The time spent writing each frame is added to ``statistics``.
+    """
+
+    def __init__(self, writer, queue_size=16, overflow_policy=BLOCK, pool=None, statistics=None):
+        self._writer = writer
+        self.pool = pool
+        self.statistics = statistics
+        self.queue = FrameQueue(queue_size, overflow_policy, on_drop=self._release)
+        self._error = None
+        self._encoder = background_executor.submit(self._encode)
+
+    @property
+    def dropped(self):
+        return self.queue.dropped
+
+    @property
+    def peak_queue_depth(self):
+        return self.queue.peak
+
+    def write(self, frame, repeat=1):
+        self._raise_encoder_error()
+        self.queue.put(frame, repeat)
+
+    def close(self):
+        self.queue.close()
+        self._encoder.result()
+        self._raise_encoder_error()
+
+    def _encode(self):
+        previous = None
+        try:
+            while True:
+                item = self.queue.get()
+                if item is None:
+                    break
+                frame, repeat = item
+                if frame is None and previous is None:
+                    continue
+                start = monotonic()
+                if frame is None and hasattr(self._writer, 'repeat'):
+                    self._writer.repeat(repeat)
+                else:
+                    self._write(previous if frame is None else frame, repeat)
+                if self.statistics:
+                    self.statistics.add_encode(monotonic() - start, repeat)
+                if frame is not None:
+                    self._release(previous)
+                    previous = frame
+        except Exception as error:
+            self._error = error
+            self.queue.close()
+            if self.pool:
+                self.pool.close()
+        finally:
+            self._release(previous)
+
+    def _write(self, frame, repeat):
+        if hasattr(self._writer, 'write_repeated'):
+            self._writer.write_repeated(frame, repeat)
+        else:
+            for _ in range(repeat):
+                self._writer.write(frame)
+
+    def _release(self, frame):
+        if self.pool and frame is not None:
+            self.pool.release(frame)
+
+    def _raise_encoder_error(self):
+        if self._error:
+            raise self._error
@@ -0,0 +1,175 @@
+#  Copyright 2008-2015 Nokia Networks
+#  Copyright 2016-     Robot Framework Foundation
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import multiprocessing
+
+try:
+    from queue import Empty
+except ImportError:
+    from Queue import Empty
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+from .utils import np
+
+_context = None
+
+
+def _get_context():
+    # Forking the Robot process could copy locks held by its capture and encoder threads. A fork
+    # server forks from a clean process instead, and with the encoders preloaded it starts every
+    # encoding process in milliseconds, where spawning a new interpreter takes about half a second.
+    global _context
+    if _context is None:
+        if 'forkserver' in multiprocessing.get_all_start_methods():
+            _context = multiprocessing.get_context('forkserver')
+            # The library imports OpenCV and NumPy lazily, so they are preloaded explicitly.
+            _context.set_forkserver_preload(['cv2', 'numpy', __name__, 'ScreenCapLibrary.encoders'])
+        else:
+            _context = multiprocessing.get_context('spawn')
+    return _context
+
+
+class ProcessEncoder(object):
+    """Runs the writers of ``encoder`` in a separate process.
+
+    Frames are copied into one of ``slots`` frame slots in shared memory and
+    only the slot number is sent to the process, so frames are never pickled
+    and the encoding does not compete for the GIL of the Robot process.
+    ``encoder`` must be picklable, like all encoders of the library are.
+    """
+
+    def __init__(self, encoder, slots=4):
+        self.encoder = encoder
+        self.extension = encoder.extension
+        self.slots = slots
+
+    def open(self, path, fps, size):
+        return ProcessWriter(self.encoder, path, fps, size, self.slots)
+
+
+class ProcessWriter(object):
+    """Hands frames to an encoding process like ``cv2.VideoWriter`` writes them to a file.
+
+    ``write`` waits while all slots are being encoded. Errors of the process
+    are raised by ``write`` and ``release``.
+    """
+
+    def __init__(self, encoder, path, fps, size, slots):
+        if shared_memory is None:
+            raise RuntimeError('Encoding in a separate process requires Python 3.8 or newer.')
+        shape = (size[1], size[0], 3)
+        frame_bytes = int(np.prod(shape))
+        self._memory = shared_memory.SharedMemory(create=True, size=frame_bytes * slots)
+        self._slots = [np.ndarray(shape, dtype=np.uint8, buffer=self._memory.buf, offset=slot * frame_bytes)
+                       for slot in range(slots)]
+        self._free = list(range(slots))
+        context = _get_context()
+        self._tasks = context.Queue()
+        self._results = context.Queue()
+        self._process = context.Process(target=_encode, args=(encoder, path, fps, size, self._memory.name,
+                                                                 slots, self._tasks, self._results))
+        self._process.daemon = True
+        self._released = False
+        try:
+            self._process.start()
+            self._receive('ready')
+        except Exception:
+            self._close()
+            raise
+
+    def write(self, frame):
+        self.write_repeated(frame, 1)
+
+    def write_repeated(self, frame, repeat):
+        while not self._free:
+            self._free.append(self._receive('free'))
+        slot = self._free.pop()
+        np.copyto(self._slots[slot], frame)
+        self._tasks.put((slot, repeat))
+
+    def release(self):
+        if self._released:
+            return
+        self._tasks.put(None)
+        try:
+            # Slots given back before the end are not needed anymore.
+            while self._receive('free', 'done') is not None:
+                pass
+        finally:
+            self._close()
+
+    def _receive(self, *expected):
+        while True:
+            try:
+                kind, value = self._results.get(timeout=0.1)
+            except Empty:
+                if not self._process.is_alive():
+                    raise RuntimeError('The encoding process exited unexpectedly.')
+                continue
+            if kind == 'error':
+                raise RuntimeError(value)
+            if kind in expected:
+                return value
+
+    def _close(self):
+        self._released = True
+        if self._process.pid is not None:
+            self._process.join(10)
+            if self._process.is_alive():
+                self._process.terminate()
+        # The shared memory can only be closed once no array uses it anymore.
+        self._slots = None
+        self._memory.close()
+        self._memory.unlink()
+
+
+def _encode(encoder, path, fps, size, memory_name, slots, tasks, results):
+    memory = shared_memory.SharedMemory(name=memory_name)
+    shape = (size[1], size[0], 3)
+    frame_bytes = int(np.prod(shape))
+    frames = [np.ndarray(shape, dtype=np.uint8, buffer=memory.buf, offset=slot * frame_bytes)
+              for slot in range(slots)]
+    writer = None
+    try:
+        writer = encoder.open(path, fps, size)
+        results.put(('ready', None))
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            slot, repeat = task
+            if hasattr(writer, 'write_repeated'):
+                writer.write_repeated(frames[slot], repeat)
+            else:
+                for _ in range(repeat):
+                    writer.write(frames[slot])
+            results.put(('free', slot))
+        writer, finished = None, writer
+        finished.release()
+        results.put(('done', None))
+    except Exception as error:
+        results.put(('error', str(error) or error.__class__.__name__))
+        if writer:
+            try:
+                writer.release()
+            except Exception:
+                pass
+    finally:
+        del frames[:]
+        memory.close()
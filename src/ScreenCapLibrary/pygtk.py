@@ -12,39 +12,34 @@
 #  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
-import cv2
-import os
-import time
-import numpy as np
-
-try:
-    import pyautogui
-except:
-    pass
-
-from .utils import suppress_stderr, resize_array, draw_cursor
-from robot.api import logger
-
-try:
-    from gtk import gdk
-except ImportError:
-    gdk = None
-
-try:
-    from gi import require_version
-
-    require_version('Gdk', '3.0')
-    from gi.repository import Gdk
-except ImportError:
-    Gdk = None
-
-try:
-    from gi import require_version
-
-    require_version('Gdk', '3.0')
-    from gi.repository import GdkPixbuf
-except ImportError:
-    GdkPixbuf = None
+import threading
+
+from .utils import np
+
+gdk = None
+Gdk = None
+_gtk_lock = threading.Lock()
+_gtk_loaded = False
+
+
+def _load_gtk():
+    """Imports PyGTK or PyGObject when the ``pygtk`` module is first used, as that takes long."""
+    global gdk, Gdk, _gtk_loaded
+    with _gtk_lock:
+        if not _gtk_loaded:
+            try:
+                from gtk import gdk
+            except ImportError:
+                try:
+                    from gi import require_version
+
+                    require_version('Gdk', '3.0')
+                    from gi.repository import Gdk
+                except ImportError:
+                    pass
+            _gtk_loaded = True
+    if not gdk and not Gdk:
+        raise RuntimeError('PyGTK not installed/supported on this platform.')
 
 
 def _gtk_quality(format, quality):
@@ -91,8 +86,7 @@ def _grab_screenshot_gtk_py3(monitor):
 
 
 def _grab_gtk_pb(monitor):
-    if not gdk and not Gdk:
-        raise RuntimeError('PyGTK not installed/supported on this platform.')
+    _load_gtk()
     if gdk:
         return _grab_screenshot_gtk_py2(monitor)
     elif Gdk:
@@ -100,8 +94,7 @@ def _grab_gtk_pb(monitor):
 
 
 def _take_gtk_screenshot(path, format, quality, monitor):
-    if not gdk and not Gdk:
-        raise RuntimeError('PyGTK not installed/supported on this platform.')
+    _load_gtk()
     if gdk:
         return _take_gtk_screenshot_py2(path, format, quality, int(monitor))
     elif Gdk:
@@ -122,19 +115,6 @@ def _take_gtk_screenshot_py3(path, format, quality, monitor):
     return path
 
 
-def _take_gtk_screen_size(monitor):
-    if not gdk and not Gdk:
-        raise RuntimeError('PyGTK not installed/supported on this platform.')
-    window = get_default_root_window()
-    if not window:
-        raise RuntimeError('Taking screenshot failed.')
-    if monitor == 0:
-        return get_window_size(window)
-    else:
-        monitors = _get_monitors(window)
-        return monitors[monitor - 1].width, monitors[monitor - 1].height
-
-
 def get_default_root_window():
     if gdk:
         return gdk.get_default_root_window()
@@ -160,8 +140,7 @@ def _get_monitors(window):
 
 
 def _take_partial_gtk_screenshot(path, format, quality, left, top, width, height, monitor):
-    if not gdk and not Gdk:
-        raise RuntimeError('PyGTK not installed/supported on this platform.')
+    _load_gtk()
     if gdk:
         return _take_partial_gtk_screenshot_py2(path, format, quality, left, top, width, height, monitor)
     elif Gdk:
@@ -188,87 +167,32 @@ def _take_partial_gtk_screenshot_py3(path, format, quality, left, top, width, he
     return path
 
 
-def _record_gtk(path, fps, size_percentage, stop, active, monitor, display_cursor):
-    if not gdk and not Gdk:
-        raise RuntimeError('PyGTK not installed/supported on this platform.')
+def _take_gtk_monitor(monitor):
+    """Returns the geometry of ``monitor`` like ``mss`` does, monitor 0 being the whole screen."""
+    _load_gtk()
     window = get_default_root_window()
     if not window:
-        raise Exception('Monitor not available.')
-    fourcc = cv2.VideoWriter_fourcc(*'VP08')
+        raise RuntimeError('Monitor not available.')
     if monitor == 0:
         width, height = get_window_size(window)
-    else:
-        width, height = _take_gtk_screen_size(monitor)
-
-    with suppress_stderr():
-        if not fps:
-            fps = benchmark_recording_performance_gtk(width, height, size_percentage, monitor, display_cursor)
-        vid = cv2.VideoWriter('%s' % path, fourcc, fps, (int(width * size_percentage), int(height * size_percentage)))
-    while not stop.isSet():
-        if not active.wait(1.0 / fps):
-            continue
-        if gdk:
-            record_gtk2(vid, width, height, size_percentage, monitor)
-        elif Gdk:
-            record_gtk3(vid, width, height, size_percentage, monitor, display_cursor)
-    vid.release()
-    cv2.destroyAllWindows()
-
-
-def record_gtk2(vid, width, height, size_percentage, monitor):
-    pb = _grab_screenshot_gtk_py2(monitor)
-    numpy_array = pb.get_pixels_array()
-    resized_array = resize_array(width, height, numpy_array, size_percentage)
-    frame = cv2.cvtColor(resized_array, cv2.COLOR_RGB2BGR)
-    vid.write(frame)
+        return {'left': 0, 'top': 0, 'width': width, 'height': height}
+    monitors = _get_monitors(window)
+    if not 0 < monitor <= len(monitors):
+        raise RuntimeError('Monitor not available.')
+    geometry = monitors[monitor - 1]
+    return {'left': geometry.x, 'top': geometry.y, 'width': geometry.width, 'height': geometry.height}
 
 
-def record_gtk3(vid, width, height, size_percentage, monitor, display_cursor=False):
-    pb = _grab_screenshot_gtk_py3(monitor)
-    if display_cursor:
-        mouse_x, mouse_y = pyautogui.position()
-    numpy_array = _convert_pixbuf_to_numpy(pb)
-    resized_array = resize_array(width, height, numpy_array, size_percentage)
-    frame = cv2.cvtColor(resized_array, cv2.COLOR_RGB2BGR)
-    if display_cursor:
-        draw_cursor(frame, mouse_x, mouse_y)
-    vid.write(frame)
+def _grab_gtk_numpy(monitor):
+    """Returns the RGB or RGBA pixels of ``monitor``, viewing the pixbuf where possible."""
+    pb = _grab_gtk_pb(monitor)
+    if gdk:
+        return pb.get_pixels_array()
+    return _convert_pixbuf_to_numpy(pb)
 
 
 def _convert_pixbuf_to_numpy(pixbuf):
+    # A view that steps over the padding at the end of each row, so nothing is copied.
+    # OpenCV reads such views directly. The last row has no padding, and needs none.
     w, h, c, r = (pixbuf.get_width(), pixbuf.get_height(), pixbuf.get_n_channels(), pixbuf.get_rowstride())
-    a = np.frombuffer(pixbuf.get_pixels(), dtype=np.uint8)
-    if a.shape[0] == w * c * h:
-        return a.reshape((h, w, c))
-    else:
-        b = np.zeros((h, w * c), 'uint8')
-        for j in range(h):
-            b[j, :] = a[r * j:r * j + w * c]
-        return b.reshape((h, w, c))
-
-
-def benchmark_recording_performance_gtk(width, height, size_percentage, monitor, display_cursor=False):
-    fps = 0
-    last_time = time.time()
-    fourcc = cv2.VideoWriter_fourcc(*'VP08')
-    # record a dummy video to compute optimal fps
-    vid = cv2.VideoWriter('benchmark_%s.webm' % last_time, fourcc, 24,
-                          (int(width * size_percentage), int(height * size_percentage)))
-    # count the number of frames captured in 2 seconds
-    while time.time() - last_time < 2:
-        fps += 1
-        if Gdk:
-            record_gtk3(vid, width, height, size_percentage, monitor, display_cursor)
-        else:
-            record_gtk2(vid, width, height, size_percentage, monitor)
-
-    vid.release()
-    cv2.destroyAllWindows()
-    if os.path.exists("benchmark_%s.webm" % last_time):
-        os.remove('benchmark_%s.webm' % last_time)  # delete the dummy file
-    logger.info('Automatically setting a fps of %s' % str(fps / 2))
-    return fps / 2  # return the number of frames per second
-
-
-def is_gdk():
-    return Gdk
+    return np.ndarray((h, w, c), dtype=np.uint8, buffer=pixbuf.get_pixels(), strides=(r, c, 1))
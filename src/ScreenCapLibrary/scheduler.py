@@ -0,0 +1,98 @@
+#  Copyright 2008-2015 Nokia Networks
+#  Copyright 2016-     Robot Framework Foundation
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+from .utils import monotonic
+
+
+class FrameScheduler(object):
+    """Captures frames at absolute deadlines so the video keeps wall-clock time.
+
+    Frame ``n`` of a recording is due at ``start + n / fps``. Sleeping a fixed
+    ``1 / fps`` after every frame would add the capture and encoding time to
+    each interval. If the capture falls behind, the deadlines that were missed
+    are not captured but filled by repeating the next captured frame, so that
+    a recording of N seconds plays for N seconds. Time spent paused is left out.
+
+    ``grab`` may return ``None`` when the screen has not changed since the
+    previous frame. The writer is then told to repeat the previous frame, in
+    the same slot, so that the video keeps growing while the screen is still.
+    Such grabs are counted as ``unchanged`` instead of ``captured``.
+    """
+
+    def __init__(self, fps):
+        self.fps = float(fps)
+        self.interval = 1.0 / self.fps
+        self.captured = 0
+        self.unchanged = 0
+        self.duplicated = 0
+        self._active_time = 0.0
+        self._start = None
+        self._slot = 0
+
+    @property
+    def written(self):
+        return self.captured + self.unchanged + self.duplicated
+
+    @property
+    def active_time(self):
+        if self._start is None:
+            return self._active_time
+        return self._active_time + monotonic() - self._start
+
+    @property
+    def achieved_fps(self):
+        """The rate the screen was grabbed at, whether it had changed or not."""
+        active_time = self.active_time
+        return (self.captured + self.unchanged) / active_time if active_time else 0.0
+
+    def run(self, grab, writer, stop, active):
+        """Writes frames returned by ``grab`` to ``writer`` until ``stop`` is set.
+
+        ``active`` is cleared while the recording is paused. ``writer`` must
+        accept the number of times the frame is repeated and ``None`` as the
+        previous frame, like `EncodingPipeline`.
+        """
+        try:
+            while not stop.isSet():
+                if not active.isSet():
+                    self._pause()
+                    active.wait(self.interval)
+                    continue
+                if self._start is None:
+                    self._start = monotonic()
+                    self._slot = 0
+                delay = self._start + self._slot * self.interval - monotonic()
+                if delay > 0 and stop.wait(delay):
+                    break
+                frame = grab()
+                writer.write(frame, self._take_slot(frame is not None) + 1)
+        finally:
+            self._pause()
+
+    def _take_slot(self, changed):
+        slot = max(int((monotonic() - self._start) / self.interval), self._slot)
+        missed = slot - self._slot
+        self._slot = slot + 1
+        if changed:
+            self.captured += 1
+        else:
+            self.unchanged += 1
+        self.duplicated += missed
+        return missed
+
+    def _pause(self):
+        if self._start is not None:
+            self._active_time += monotonic() - self._start
+            self._start = None
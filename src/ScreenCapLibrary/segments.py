@@ -0,0 +1,164 @@
+#  Copyright 2008-2015 Nokia Networks
+#  Copyright 2016-     Robot Framework Foundation
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import json
+import os
+import re
+import tempfile
+
+from robot.utils import timestr_to_secs
+
+_replace = getattr(os, 'replace', os.rename)
+
+SIZE_UNITS = {'': 1, 'b': 1, 'kb': 1024, 'mb': 1024 ** 2, 'gb': 1024 ** 3}
+
+
+def norm_segment_options(length, size, max_segments):
+    """Returns the segment length in seconds, size in bytes and number of segments kept, or ``None``s."""
+    length = timestr_to_secs(length) if length else None
+    if length is not None and length <= 0:
+        raise ValueError('The segment length must be greater than 0.')
+    size = _parse_size(size) if size else None
+    try:
+        max_segments = int(max_segments) if max_segments else None
+    except ValueError:
+        raise ValueError('The max segments argument must be of type integer.')
+    if max_segments is not None and max_segments < 1:
+        raise ValueError('The max segments must be greater than 0.')
+    return length, size, max_segments
+
+
+def _parse_size(size):
+    match = re.match(r'^\s*(\d+(?:\.\d+)?)\s*([a-z]*)\s*$', str(size).lower())
+    if not match or match.group(2) not in SIZE_UNITS or float(match.group(1)) <= 0:
+        raise ValueError("Invalid segment size '%s'. Use e.g. '50 MB'." % size)
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2)])
+
+
+class SegmentedEncoder(object):
+    """Splits a recording into separate video files written with ``encoder``.
+
+    A new segment is started when the current one is ``length`` seconds of
+    video long or has grown to ``size`` bytes. Finished segments are closed
+    right away, so they stay usable even if the process dies, and only the
+    newest ``max_segments`` are kept. The segments are listed in a JSON
+    manifest, which is the path given to `open`.
+    """
+
+    extension = 'json'
+
+    def __init__(self, encoder, length=None, size=None, max_segments=None):
+        self.encoder = encoder
+        self.length = length
+        self.size = size
+        self.max_segments = max_segments
+        self.writer = None
+
+    def open(self, path, fps, size):
+        self.writer = SegmentWriter(self, path, fps, size)
+        return self.writer
+
+
+class SegmentWriter(object):
+
+    def __init__(self, segmented, manifest_path, fps, size):
+        self.segmented = segmented
+        self.manifest_path = manifest_path
+        self.fps = fps
+        self.size = size
+        self.segments = []
+        self._base = os.path.splitext(manifest_path)[0]
+        self._index = 0
+        self._frames = 0
+        self._writer = None
+        self._current = None
+        self._frame_limit = int(segmented.length * fps) if segmented.length else None
+        # The file size is checked once per second of video instead of after every frame.
+        self._size_check_interval = max(int(fps), 1)
+        self._start_segment()
+
+    @property
+    def paths(self):
+        return [segment['path'] for segment in self.segments]
+
+    def write(self, frame):
+        if not self._writer:
+            self._start_segment()
+        self._writer.write(frame)
+        self._current['frames'] += 1
+        self._frames += 1
+        # The scheduler writes every slot, also while the screen does not change, so a full
+        # segment is closed right away instead of when the frame after it arrives.
+        if self._is_full():
+            self._finish_segment()
+
+    def release(self):
+        if self._writer:
+            self._finish_segment()
+        self._write_manifest(complete=True)
+
+    def _is_full(self):
+        frames = self._current['frames']
+        if self._frame_limit and frames >= self._frame_limit:
+            return True
+        if self.segmented.size and frames % self._size_check_interval == 0:
+            return self._file_size(self._current['path']) >= self.segmented.size
+        return False
+
+    @staticmethod
+    def _file_size(path):
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+
+    def _start_segment(self):
+        self._index += 1
+        path = '%s-%03d.%s' % (self._base, self._index, self.segmented.encoder.extension)
+        self._writer = self.segmented.encoder.open(path, self.fps, self.size)
+        self._current = {'path': path, 'start': float(self._frames) / self.fps, 'frames': 0}
+        self.segments.append(self._current)
+        self._prune()
+        self._write_manifest(complete=False)
+
+    def _finish_segment(self):
+        self._writer.release()
+        self._writer = None
+        self._current['duration'] = float(self._current['frames']) / self.fps
+        self._current['bytes'] = self._file_size(self._current['path'])
+        self._write_manifest(complete=False)
+
+    def _prune(self):
+        # The segment being written is the last one, so only finished ones are removed.
+        max_segments = self.segmented.max_segments
+        while max_segments and len(self.segments) > max_segments:
+            try:
+                os.remove(self.segments.pop(0)['path'])
+            except OSError:
+                pass
+
+    def _write_manifest(self, complete):
+        manifest = {
+            'fps': self.fps,
+            'size': list(self.size),
+            'complete': complete,
+            'segments': [dict(segment, path=os.path.basename(segment['path'])) for segment in self.segments]
+        }
+        directory = os.path.dirname(self.manifest_path) or '.'
+        # Replaced at once, so that a reader never sees half a manifest.
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+        _replace(temp_path, self.manifest_path)
@@ -0,0 +1,105 @@
+#  Copyright 2008-2015 Nokia Networks
+#  Copyright 2016-     Robot Framework Foundation
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import math
+import os
+import threading
+
+from array import array
+
+from .utils import monotonic
+
+
+class RecordingStatistics(object):
+    """Collects what a recording achieved.
+
+    Grab and encode latencies are kept as compact samples, 8 bytes each, so
+    that percentiles can be reported. Captured and encoded frames are counted
+    while recording, the other values are set once the recording has stopped.
+    """
+
+    def __init__(self):
+        self.captured = 0
+        self.encoded = 0
+        self.dropped = 0
+        self.duplicated = 0
+        self.achieved_fps = None
+        self.bytes_written = 0
+        self.peak_queue_depth = 0
+        self._grab_times = array('d')
+        self._encode_times = array('d')
+        self._lock = threading.Lock()
+
+    def timed_grab(self, grab):
+        """Returns ``grab`` wrapped so that its calls are counted and timed."""
+        def timed():
+            start = monotonic()
+            frame = grab()
+            self.add_grab(monotonic() - start)
+            return frame
+        return timed
+
+    def add_grab(self, seconds):
+        with self._lock:
+            self._grab_times.append(seconds)
+            self.captured += 1
+
+    def add_encode(self, seconds, frames=1):
+        with self._lock:
+            self._encode_times.append(seconds)
+            self.encoded += frames
+
+    def add_files(self, paths):
+        self.bytes_written = sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+
+    def as_dict(self):
+        with self._lock:
+            statistics = {
+                'captured_frames': self.captured,
+                'encoded_frames': self.encoded,
+                'dropped_frames': self.dropped,
+                'duplicated_frames': self.duplicated,
+                'achieved_fps': self.achieved_fps,
+                'bytes_written': self.bytes_written,
+                'peak_queue_depth': self.peak_queue_depth,
+            }
+            for name, samples in (('grab', self._grab_times), ('encode', self._encode_times)):
+                samples = sorted(samples)
+                statistics['%s_latency_p50' % name] = _percentile(samples, 50)
+                statistics['%s_latency_p95' % name] = _percentile(samples, 95)
+                statistics['%s_latency_max' % name] = samples[-1] if samples else None
+        return statistics
+
+    def summary(self):
+        statistics = self.as_dict()
+        latencies = []
+        for name, action in (('grab', 'grabbing'), ('encode', 'encoding')):
+            values = [statistics['%s_latency_%s' % (name, kind)] for kind in ('p50', 'p95', 'max')]
+            if values[0] is not None:
+                latencies.append('%.1f/%.1f/%.1f ms %s' % (tuple(value * 1000 for value in values) + (action,)))
+        fps = statistics['achieved_fps']
+        return ('Captured %d frames at %s fps, encoded %d, dropped %d and duplicated %d. '
+                'Latency p50/p95/max: %s. Wrote %d bytes with at most %d frames waiting for the encoder.'
+                % (statistics['captured_frames'], '%.2f' % fps if fps is not None else 'unknown',
+                   statistics['encoded_frames'], statistics['dropped_frames'], statistics['duplicated_frames'],
+                   ', '.join(latencies) or 'not measured', statistics['bytes_written'],
+                   statistics['peak_queue_depth']))
+
+
+def _percentile(samples, percent):
+    """Returns the nearest-rank percentile of the sorted ``samples``."""
+    if not samples:
+        return None
+    return samples[max(int(math.ceil(percent / 100.0 * len(samples))) - 1, 0)]
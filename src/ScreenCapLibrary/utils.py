@@ -13,12 +13,42 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
+import importlib
 import os
-import cv2
-import numpy as np
+import time
 
-cursor_x_list = [0, 8, 6, 14, 12, 4, 2, 0]
-cursor_y_list = [0, 2, 4, 12, 14, 6, 8, 0]
+monotonic = getattr(time, 'monotonic', time.time)
+
+
+class LazyModule(object):
+    """Stands in for the module ``name`` and imports it when it is first used.
+
+    OpenCV, NumPy, Pillow and the screen grabbing modules take long to
+    import, which would slow down every Robot run, dry-run and libdoc
+    generation using the library even when no keyword needs them. If the
+    import fails, ``message`` is used for the ``ImportError``.
+    """
+
+    def __init__(self, name, message=None):
+        self._name = name
+        self._message = message
+
+    def __getattr__(self, attribute):
+        # Only called for attributes the instance does not have, i.e. those of the module.
+        try:
+            module = importlib.import_module(self._name)
+        except ImportError:
+            if self._message:
+                raise ImportError(self._message)
+            raise
+        value = getattr(module, attribute)
+        # Later uses get the attribute directly, without calling this method again.
+        setattr(self, attribute, value)
+        return value
+
+
+cv2 = LazyModule('cv2', 'Importing cv2 failed. Make sure you have opencv-python installed.')
+np = LazyModule('numpy')
 
 
 def _norm_path(path):
@@ -57,23 +87,16 @@ def _pil_quality_conversion(value):
         raise RuntimeError("The image quality argument must be of type integer.")
 
 
-def resize_array(width, height, numpy_array, size_percentage):
-    resized_array = cv2.resize(numpy_array, dsize=(int(width * size_percentage), int(height * size_percentage)),
-                               interpolation=cv2.INTER_AREA) \
-        if size_percentage != 1 else numpy_array
-    return resized_array
-
-
-def draw_cursor(frame, mouse_x, mouse_y):
-    cursor_x = [x + mouse_x for x in cursor_x_list]
-    cursor_y = [y + mouse_y for y in cursor_y_list]
-    cursor_points = list(zip(cursor_x, cursor_y))
-    cursor_points = np.array(cursor_points, 'int32')
-    cv2.fillPoly(frame, [cursor_points], color=[0, 255, 255])
-
-
-def is_pygtk(screenshot_module):
-    return screenshot_module and screenshot_module.lower() == 'pygtk'
+def _pil_format_and_quality(format, quality):
+    """Returns the Pillow format name and its quality setting for ``format`` and ``quality``."""
+    format = 'jpeg' if format == 'jpg' else format
+    if format == 'png':
+        return format, _compression_value_conversion(quality)
+    if format == 'jpeg':
+        return format, _pil_quality_conversion(quality)
+    if format == 'webp':
+        return format, int(quality)
+    raise RuntimeError("Invalid screenshot format.")
 
 
 class suppress_stderr(object):
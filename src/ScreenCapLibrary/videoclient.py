@@ -1,29 +1,29 @@
+import json
 import os
+import tempfile
 import time
 import threading
 
 from .client import Client, run_in_background
-from .pygtk import _record_gtk, benchmark_recording_performance_gtk, _take_gtk_screen_size
-from .utils import _norm_path, suppress_stderr, resize_array, draw_cursor, is_pygtk
-from mss import mss
+from .cursor import cursor_overlay
+from .encoders import get_encoder
+from .fpscache import fps_cache
+from .frames import ChangeDetector, FrameConverter, FramePool, norm_resize_policy
+from .pipeline import EncodingPipeline, norm_pipeline_options
+from .processencoder import ProcessEncoder
+from .segments import SegmentedEncoder, norm_segment_options
+from .stats import RecordingStatistics
+from .scheduler import FrameScheduler
+from .utils import _norm_path, cv2, np, suppress_stderr
 from robot.utils import get_link_path, is_truthy
 from robot.api import logger
 import base64
-try:
-    import pyautogui
-except:
-    pass
-
-try:
-    import cv2
-    import numpy as np
-except ImportError:
-    raise ImportError('Importing cv2 failed. Make sure you have opencv-python installed.')
 
 
 class VideoClient(Client):
 
-    def __init__(self, screenshot_module, screenshot_directory, fps, display_cursor):
+    def __init__(self, screenshot_module, screenshot_directory, fps, display_cursor, fps_cache_ttl=0, encoder=None,
+                 resize=None):
         Client.__init__(self)
         self.screenshot_module = screenshot_module
         self._given_screenshot_dir = _norm_path(screenshot_directory)
@@ -31,112 +31,198 @@ class VideoClient(Client):
         self._active_condition = threading.Event()
         self._active_condition.set()
         self.alias = None
+        self.queue_size = None
+        self.overflow_policy = None
+        self.dropped_frames = 0
+        self.duplicated_frames = 0
+        self.achieved_fps = None
+        self.statistics = RecordingStatistics()
+        self.encoder = get_encoder(encoder)
+        self.resize = norm_resize_policy(resize)
+        self.segmented_encoder = None
+        self.encode_in_process = False
+        self.fps_cache_ttl = fps_cache_ttl
         try:
-            if not fps:
-                with suppress_stderr():
-                    if is_pygtk(self.screenshot_module):
-                        width, height = _take_gtk_screen_size(monitor=1)
-                        self.fps = benchmark_recording_performance_gtk(width, height, 1, monitor=1)
-                    else:
-                        with mss() as sct:
-                            width = int(sct.grab(sct.monitors[1]).width)
-                            height = int(sct.grab(sct.monitors[1]).height)
-                            self.fps = self.benchmark_recording_performance(width, height, 1, monitor=1)
-            else:
-                self.fps = int(fps)
+            self.fps = int(fps) if fps else None
         except ValueError:
             raise ValueError('The fps argument must be of type integer.')
 
-    def start_video_recording(self, alias, name, size_percentage, embed, embed_width, monitor):
+    def measure_fps(self, size_percentage, monitor, force=False):
+        """Returns the frame rate this system can record at with the selected encoder.
+
+        The result of the benchmark is cached on disk for ``fps_cache_ttl``
+        seconds unless ``force`` is used.
+        """
+        monitor = int(monitor)
+        mon = self.backend.monitor(monitor)
+        width, height = mon['width'], mon['height']
+        key = fps_cache.key(self.backend.name, (mon['left'], mon['top'], width, height), size_percentage,
+                            self.display_cursor, self.encoder.name, self.resize)
+        fps = None if force else fps_cache.get(key, self.fps_cache_ttl)
+        if fps:
+            logger.info('Automatically setting a fps of %s (measured earlier)' % fps)
+            return fps
+        with suppress_stderr():
+            fps = self.benchmark_recording_performance(width, height, size_percentage, monitor)
+        fps_cache.set(key, fps)
+        return fps
+
+    def start_video_recording(self, alias, name, size_percentage, embed, embed_width, monitor,
+                              queue_size=16, overflow_policy='block', segment_length=None, segment_size=None,
+                              max_segments=None, encode_in_process=False):
+        self.queue_size, self.overflow_policy = norm_pipeline_options(queue_size, overflow_policy)
+        self.encode_in_process = is_truthy(encode_in_process)
+        length, size, max_segments = norm_segment_options(segment_length, segment_size, max_segments)
+        if length or size:
+            self.segmented_encoder = SegmentedEncoder(self.encoder, length, size, max_segments)
+        if not self.fps:
+            self.fps = self.measure_fps(size_percentage, monitor)
         self.alias = alias
         self.name = name
         self.embed = embed
         self.embed_width = embed_width
-        self.path = self._save_screenshot_path(basename=self.name, format='webm')
-        self.futures = self.capture_screen(self.path, self.fps, size_percentage, int(monitor))
-        self.clear_thread_queues()
+        self.path = self._save_screenshot_path(basename=self.name, format=self._capture_encoder.extension)
+        converter, vid = self._open_writer(self.path, self.fps, size_percentage, int(monitor))
+        self.futures = self.capture_screen(vid, converter, self.fps, int(monitor))
 
-    def stop_video_recording(self, save_to_disk):
+    def stop_video_recording(self, save_to_disk, log_statistics=False):
         self._stop_thread()
-        if is_truthy(self.embed):
+        self.statistics.add_files(self._segment_paths() if self.segmented_encoder else [self.path])
+        if self.segmented_encoder:
+            self._embed_segments(save_to_disk)
+        elif is_truthy(self.embed):
             self._embed_video(self.path, self.embed_width, save_to_disk)
+        if self.achieved_fps is not None:
+            logger.info('Captured frames at %.2f fps of the targeted %s fps, %d frames were repeated to keep '
+                        'the video in real time.' % (self.achieved_fps, self.fps, self.duplicated_frames))
+        if self.dropped_frames:
+            logger.info('%d frames were dropped from the recording because the encoder could not keep up.'
+                        % self.dropped_frames)
+        if is_truthy(log_statistics):
+            logger.info(self.statistics.summary())
         return self.path
 
+    @property
+    def _capture_encoder(self):
+        """The encoder that the captured frames are written with."""
+        encoder = self.segmented_encoder or self.encoder
+        return ProcessEncoder(encoder) if self.encode_in_process else encoder
+
+    def _segment_paths(self):
+        # The manifest is read because the segments may have been written by another process.
+        try:
+            with open(self.path) as manifest:
+                return [os.path.join(os.path.dirname(self.path), segment['path'])
+                        for segment in json.load(manifest)['segments']]
+        except (IOError, ValueError):
+            return []
+
+    def _embed_segments(self, save_to_disk):
+        segments = self._segment_paths()
+        if is_truthy(self.embed):
+            for path in segments:
+                self._embed_video(path, self.embed_width, save_to_disk)
+        if not save_to_disk:
+            # The segments were removed once embedded, so the manifest would only list missing files.
+            for path in segments:
+                if os.path.exists(path):
+                    os.remove(path)
+            os.remove(self.path)
+
     def _pause_thread(self):
         self._active_condition.clear()
 
     def _resume_thread(self):
         self._active_condition.set()
 
+    def _open_writer(self, path, fps, size_percentage, monitor):
+        """Opens the writer before the recording starts, so that e.g. a missing ``ffmpeg`` fails the keyword."""
+        width, height = self.backend.size(monitor)
+        converter = FrameConverter(width, height, size_percentage, cv2.COLOR_RGBA2RGB, self.resize)
+        return converter, self._capture_encoder.open(path, fps, converter.size)
+
     @run_in_background
-    def capture_screen(self, path, fps, size_percentage, monitor):
-        if is_pygtk(self.screenshot_module):
-            _record_gtk(path, fps, size_percentage, self._stop_condition, self._active_condition, monitor,
-                        self.display_cursor)
+    def capture_screen(self, vid, converter, fps, monitor):
+        pipeline, scheduler = self._record(vid, converter, fps, monitor)
+        self.dropped_frames = self.statistics.dropped = pipeline.dropped
+        self.duplicated_frames = self.statistics.duplicated = scheduler.duplicated
+        self.achieved_fps = self.statistics.achieved_fps = scheduler.achieved_fps
+        self.statistics.peak_queue_depth = pipeline.peak_queue_depth
+
+    def _record(self, vid, converter, fps, monitor):
+        try:
+            # Every queued frame, plus the one being captured, the one being encoded and
+            # the previous one the encoder keeps to repeat it, needs a buffer.
+            pool = FramePool(converter.shape, self.queue_size + 3)
+            pipeline = EncodingPipeline(vid, self.queue_size, self.overflow_policy, pool, self.statistics)
+        except Exception:
+            vid.release()
+            raise
+        scheduler = FrameScheduler(fps)
+        detector = ChangeDetector()
+        subscription = self.backend.hub.subscribe(monitor, fps)
+        try:
+            with cursor_overlay(self.display_cursor, self.backend, monitor, converter.size) as cursor:
+                grab = lambda: self.grab_frame(converter, monitor, pool, cursor, detector, subscription)
+                scheduler.run(self.statistics.timed_grab(grab), pipeline, self._stop_condition,
+                              self._active_condition)
+        finally:
+            self.backend.hub.unsubscribe(subscription)
+            try:
+                pipeline.close()
+            finally:
+                vid.release()
+        return pipeline, scheduler
+
+    def record(self, vid, converter, monitor, cursor=None):
+        vid.write(self.grab_frame(converter, monitor, cursor=cursor))
+
+    def grab_frame(self, converter, monitor, pool=None, cursor=None, detector=None, subscription=None):
+        """Returns the converted frame, or ``None`` if ``detector`` finds the screen unchanged.
+
+        With a ``subscription`` the screen is grabbed through the `CaptureHub` of the backend.
+        ``cursor`` is the `CursorOverlay` drawn over the frame.
+        """
+        if subscription:
+            pixels = self.backend.hub.grab(subscription, monitor)
         else:
-            self._record_mss(path, fps, size_percentage, monitor)
-
-    def _record_mss(self, path, fps, size_percentage, monitor):
-        fourcc = cv2.VideoWriter_fourcc(*'VP08')
-        with mss() as sct:
-            mon = sct.monitors[monitor]
-            if not sct.grab(mon):
-                raise Exception('Monitor not available.')
-            width = sct.grab(mon).width
-            height = sct.grab(mon).height
-        with suppress_stderr():
-            if not fps:
-                fps = self.benchmark_recording_performance(width, height, size_percentage, monitor)
-            vid = cv2.VideoWriter('%s' % path, fourcc, fps,
-                                  (int(width * size_percentage), int(height * size_percentage)))
-        while not self._stop_condition.isSet():
-            if not self._active_condition.wait(1.0 / fps):
-                continue
-            self.record(vid, width, height, size_percentage, monitor, display_cursor=self.display_cursor)
-        vid.release()
-        cv2.destroyAllWindows()
-
-    @staticmethod
-    def record(vid, width, height, size_percentage, monitor, display_cursor=False):
-        with mss() as sct:
-            sct_img = sct.grab(sct.monitors[monitor])
-            if display_cursor:
-                mouse_x, mouse_y = pyautogui.position()
-        numpy_array = np.array(sct_img)
-        resized_array = resize_array(width, height, numpy_array, size_percentage)
-        frame = cv2.cvtColor(resized_array, cv2.COLOR_RGBA2RGB)
-        if display_cursor:
-            draw_cursor(frame, mouse_x, mouse_y)
-        vid.write(frame)
+            pixels = self.backend.grab(monitor)
+        position = cursor.position if cursor else None
+        if detector and not detector.changed(pixels, position):
+            return None
+        frame = converter.convert(pixels, pool.acquire() if pool else None)
+        if cursor:
+            cursor.draw(frame, position)
+        return frame
 
     def _embed_video(self, path, width, save_to_disk):
         link = get_link_path(path, self._log_dir)
         if save_to_disk:
-            logger.info('<a href="%s"><video width="%s" autoplay><source src="%s" type="video/webm"></video></a>' %
-                        (link, width, link), html=True)
+            logger.info('<a href="%s"><video width="%s" autoplay><source src="%s" type="%s"></video></a>' %
+                        (link, width, link, self.encoder.mime_type), html=True)
         else:
             with open(path, "rb") as image_file:
-                logger.info('<video width="%s" autoplay><source src="data:video/webm;base64, %s" type="video/webm"></video>' %
-                            (width, (base64.b64encode(image_file.read())).decode("utf-8")), html=True)
+                logger.info('<video width="%s" autoplay><source src="data:%s;base64, %s" type="%s"></video>' %
+                            (width, self.encoder.mime_type, (base64.b64encode(image_file.read())).decode("utf-8"),
+                             self.encoder.mime_type), html=True)
             os.remove(path)
 
     def benchmark_recording_performance(self, width, height, size_percentage, monitor):
         fps = 0
         last_time = time.time()
-        fourcc = cv2.VideoWriter_fourcc(*'VP08')
         # record a dummy video to compute optimal fps
-        vid = cv2.VideoWriter('benchmark_%s.webm' % last_time, fourcc, 24, (int(width * size_percentage),
-                              int(height * size_percentage)))
-
+        dummy_path = os.path.join(tempfile.gettempdir(), 'benchmark_%s.%s' % (last_time, self.encoder.extension))
+        converter = FrameConverter(width, height, size_percentage, cv2.COLOR_RGBA2RGB, self.resize)
+        vid = self.encoder.open(dummy_path, 24, converter.size)
         # count the number of frames captured in 2 seconds
-        while time.time() - last_time < 2:
-            fps += 1
-            self.record(vid, width, height, size_percentage, monitor, self.display_cursor)
+        with cursor_overlay(self.display_cursor, self.backend, monitor, converter.size) as cursor:
+            while time.time() - last_time < 2:
+                fps += 1
+                self.record(vid, converter, monitor, cursor)
 
         vid.release()
-        cv2.destroyAllWindows()
-        if os.path.exists("benchmark_%s.webm" % last_time):
-            os.remove('benchmark_%s.webm' % last_time)  # delete the dummy file
+        if os.path.exists(dummy_path):
+            os.remove(dummy_path)  # delete the dummy file
         logger.info('Automatically setting a fps of %s' % str(fps / 2))
         return fps / 2  # return the number of frames per second
 
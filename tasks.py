@@ -1,3 +1,4 @@
+import shlex
 import sys
 from pathlib import Path
 
@@ -79,6 +80,42 @@ def project_docs(ctx):
     print(Path(args[-1]).absolute())
 
 
+@task
+def benchmark(ctx, output=None, baseline=None, tolerance=0.2, quick=False, source='synthetic'):
+    """Runs the recording benchmarks in `benchmarks/recording.py`.
+
+    Args:
+        output:    Write the results as JSON to this file.
+        baseline:  Compare the results with an earlier output and fail if
+                   any metric got worse by more than the tolerance.
+        tolerance: Allowed relative change of a metric, 0.2 by default.
+        quick:     Run only a few small scenarios.
+        source:    Use a ``synthetic`` screen (default) or the real
+                   ``screen``, e.g. one started with ``xvfb-run``.
+    """
+    args = [sys.executable, 'benchmarks/recording.py', '--source', source,
+            '--tolerance', str(tolerance)]
+    if quick:
+        args.append('--quick')
+    if output:
+        args += ['--output', output]
+    if baseline:
+        args += ['--baseline', baseline]
+    ctx.run(' '.join(shlex.quote(arg) for arg in args))
+
+
+@task
+def benchmark_import(ctx, rounds=5, limit=100):
+    """Checks that importing the library stays fast with `benchmarks/import_time.py`.
+
+    Args:
+        rounds: Number of fresh interpreters to measure.
+        limit:  Highest allowed median import time in milliseconds.
+    """
+    ctx.run('%s benchmarks/import_time.py --rounds %d --limit %s' % (shlex.quote(sys.executable), int(rounds),
+                                                                      float(limit)))
+
+
 @task
 def set_version(ctx, version):
     """Set project version in `src/ScreenCapLibrary/version.py`` file.